@@ -1,70 +1,522 @@
 # This script take any number of input images (e.g. md snapshots) and compute the average
 # Image processing algorithm - by ChatGPT-5
 # Script adaptation for any number of input images + bug fixes by GLEB NOVIKOV
+# Streaming version: images are decoded on a thread pool and summed in place into a uint32
+# accumulator, with a bounded prefetch, so memory stays at a few frames whatever the folder size
+# Variance / std / min / max maps (where the structure moves) come from the same pass (Welford updates)
+# Sliding-window mode: one motion-blur frame per snapshot, averaging its K neighbours (ring buffer + running sum)
+# Incremental mode: the running sum, count, a manifest (size, mtime) of the summed files and the registration
+# settings are saved, so a re-run over a growing folder decodes only the new snapshots (optionally watching the folder)
+# Registration: camera jitter is removed by FFT phase correlation (sub-pixel) on downsampled luminance,
+# each snapshot is shifted onto the reference before it is accumulated
 # (c) The Visual Hub, 2025
+#
+# Usage: python Advanced_averageSNAP.py [folder] [-o output.png] [--workers 4] [--headless]
+#        python Advanced_averageSNAP.py [folder] --stats std min max --stats-style heatmap
+#        python Advanced_averageSNAP.py [folder] --window 9 --frames-dir ./motion_blur
+#        python Advanced_averageSNAP.py [folder] --state ./MD_snaps/.average_state.npz --watch 30
+#        python Advanced_averageSNAP.py [folder] --register [--reference first_snapshot.png]
 
 import os
+import time
+import json
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 import numpy as np
-import matplotlib.pyplot as plt
 
 # Folder with all MD snapshots
 folder_path = "./MD_snaps"
+# Where to save the average snapshot
+avg_img_path = "./average_structure.png"
+scale_factor = 3  # e.g., triple the dimensions
 
-# get all MD snapshots in the list
-image_files = [
-    f for f in os.listdir(folder_path)
-    if f.lower().endswith(('.png', '.jpg', '.jpeg'))
-]
-
-if not image_files:
-    raise ValueError("No images found in MD_snaps folder.")
-
-# Sort files for consistent order (optional)
-#image_files.sort()
-
-# total number of images found:
-print(f"Detected {len(image_files)} images. Starting processing ..")
-print(f"KEEP YOU PATIENCE!")
-
-# Initialize accumulator
-sum_arr = None
-count = 0
-
-# Loop through all images
-for filename in image_files:
-    img_path = os.path.join(folder_path, filename)
-    img = Image.open(img_path).convert("RGBA")
-    arr = np.array(img, dtype=float)
-    
-    if sum_arr is None:
-        sum_arr = arr
-    else:
+# Streaming options
+decode_workers = 4 # images decoded in parallel
+prefetch = 8 # at most this many decoded images wait for the accumulator
+
+# Extra per-pixel maps computed in the same pass, saved next to the average (e.g. average_structure_std.png)
+extra_stats = [] # any of "variance", "std", "min", "max"
+stats_style = "heatmap" # variance/std as "heatmap" (one map through a colormap) or "image" (per channel)
+colormap = "inferno"
+
+# Sliding-window (motion-blur) mode: window of K snapshots centred on each frame, 0 = off
+window_size = 0
+blur_dir = "./motion_blur"
+
+# Incremental mode: where the accumulator is kept between runs ("" = off)
+state_path = ""
+watch_interval = 0 # seconds between two scans of the folder, 0 = single run
+
+# Registration (alignment of the snapshots before averaging)
+register = False
+register_scale = 4 # luminance downsampling for the correlation (4 = 1/16 of the pixels)
+register_reference = "" # "" = the first snapshot
+register_subpixel = True # False: shifts rounded to whole pixels (a plain copy, no interpolation)
+
+def list_snapshots(folder):
+    # get all MD snapshots in the list (sorted for a consistent order)
+    image_files = sorted(
+        f for f in os.listdir(folder)
+        if f.lower().endswith(('.png', '.jpg', '.jpeg'))
+    )
+    if not image_files:
+        raise ValueError(f"No images found in {folder} folder.")
+    return [os.path.join(folder, f) for f in image_files]
+
+def decode_snapshot(img_path):
+    # 8-bit RGBA, 4 bytes per pixel (Pillow releases the GIL while decoding)
+    with Image.open(img_path) as img:
+        return np.asarray(img.convert("RGBA"))
+
+def iter_decoded(paths, workers=decode_workers, prefetch=prefetch):
+    # decoded images in order, with at most `prefetch` of them in flight
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        pending = deque()
+        paths = iter(paths)
+        for path in paths:
+            pending.append((path, pool.submit(decode_snapshot, path)))
+            if len(pending) >= max(1, prefetch):
+                break
+        while pending:
+            path, future = pending.popleft()
+            arr = future.result()
+            next_path = next(paths, None)
+            if next_path is not None:
+                pending.append((next_path, pool.submit(decode_snapshot, next_path)))
+            yield path, arr
+
+def luminance(arr, scale=register_scale):
+    # downsampled first (box filter), then converted to grey
+    img = Image.fromarray(arr)
+    if scale > 1:
+        img = img.reduce(scale)
+    return np.asarray(img.convert("L"), dtype=np.float32)
+
+class PhaseCorrelator:
+    # the FFT of the reference is computed once; frames are correlated by batches
+    # (one rfft2 and one irfft2 call for the whole batch)
+    def __init__(self, reference, scale=register_scale, subpixel=register_subpixel, name=""):
+        self.scale = max(1, scale)
+        self.subpixel = subpixel
+        self.name = name # path of the reference snapshot (recorded in the incremental state)
+        lum = luminance(reference, self.scale)
+        self.shape = lum.shape
+        self.window = np.outer(np.hanning(lum.shape[0]), np.hanning(lum.shape[1])).astype(np.float32)
+        self.ref_conj = np.conj(np.fft.rfft2(self.prepare(lum)))
+
+    def prepare(self, lum):
+        # zero mean + Hann window, so the image borders do not correlate
+        return (lum - lum.mean(axis=(-2, -1), keepdims=True)) * self.window
+
+    def shifts(self, arrays, pool=None):
+        # (dy, dx) in full-resolution pixels of every frame against the reference
+        downsample = lambda arr: luminance(arr, self.scale)
+        lum = np.stack(list(pool.map(downsample, arrays) if pool else map(downsample, arrays)))
+        if lum.shape[1:] != self.shape:
+            raise ValueError("The snapshots and the reference differ in size")
+        cross = np.fft.rfft2(self.prepare(lum)) * self.ref_conj
+        cross /= np.abs(cross) + 1e-9
+        corr = np.fft.irfft2(cross, s=self.shape)
+        shifts = [self.peak(c) * self.scale for c in corr]
+        return shifts if self.subpixel else [np.round(shift) for shift in shifts]
+
+    @staticmethod
+    def peak(corr):
+        # integer peak refined by a parabola through its neighbours, wrapped to signed shifts
+        h, w = corr.shape
+        py, px = np.unravel_index(np.argmax(corr), corr.shape)
+
+        def refine(before, center, after):
+            denom = before - 2 * center + after
+            return 0.5 * (before - after) / denom if denom else 0.0
+
+        dy = py + refine(corr[(py - 1) % h, px], corr[py, px], corr[(py + 1) % h, px])
+        dx = px + refine(corr[py, (px - 1) % w], corr[py, px], corr[py, (px + 1) % w])
+        return np.array([dy - h if dy > h / 2 else dy, dx - w if dx > w / 2 else dx])
+
+def lerp_next(lo, hi, weight):
+    # lo + (hi - lo) * weight / 128, rounded, in place on one int16 buffer
+    out = hi.astype(np.int16)
+    out -= lo
+    out *= weight
+    out += 64
+    out >>= 7
+    out += lo
+    return out.astype(np.uint8)
+
+def shift_snapshot(arr, dy, dx):
+    # content moved back by (dy, dx): integer part by slicing, fractional part by separable linear
+    # interpolation in fixed point (1/128 px); uncovered borders take the corner (background) colour
+    if abs(dy) < 0.05 and abs(dx) < 0.05:
+        return arr
+    iy, ix = int(np.floor(dy)), int(np.floor(dx))
+    wy, wx = round((dy - iy) * 128), round((dx - ix) * 128)
+    if wy == 128:
+        iy, wy = iy + 1, 0
+    if wx == 128:
+        ix, wx = ix + 1, 0
+    src = arr
+    if wx:
+        src = lerp_next(src[:, :-1], src[:, 1:], wx)
+    if wy:
+        src = lerp_next(src[:-1], src[1:], wy)
+
+    out = np.empty_like(arr)
+    out[...] = arr[0, 0]
+    h, w = src.shape[:2]
+    y0, y1 = max(0, -iy), min(arr.shape[0], h - iy)
+    x0, x1 = max(0, -ix), min(arr.shape[1], w - ix)
+    if y0 < y1 and x0 < x1:
+        out[y0:y1, x0:x1] = src[y0 + iy:y1 + iy, x0 + ix:x1 + ix]
+    return out
+
+def iter_frames(paths, workers=decode_workers, prefetch=prefetch, align=None):
+    # decoded snapshots in order, shifted onto the reference of `align` (a PhaseCorrelator) if given
+    frames = iter_decoded(paths, workers, prefetch)
+    if align is None:
+        yield from frames
+        return
+
+    # downsampling and shifting run on threads too (Pillow and NumPy release the GIL)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        def aligned(batch):
+            arrays = [arr for _, arr in batch]
+            shifts = align.shifts(arrays, pool)
+            shifted = pool.map(lambda job: shift_snapshot(job[0], *job[1]), zip(arrays, shifts))
+            return zip([path for path, _ in batch], shifted)
+
+        batch = []
+        for item in frames:
+            batch.append(item)
+            if len(batch) >= max(1, prefetch):
+                yield from aligned(batch)
+                batch = []
+        if batch:
+            yield from aligned(batch)
+
+def sum_snapshots(paths, workers=decode_workers, prefetch=prefetch, sum_arr=None, align=None):
+    # Initialize accumulator (uint32 holds the sum of up to 16 million 8-bit images)
+    count = 0
+
+    # Loop through all images
+    for img_path, arr in iter_frames(paths, workers, prefetch, align):
+        if sum_arr is None:
+            sum_arr = np.zeros(arr.shape, dtype=np.uint32)
+        elif arr.shape != sum_arr.shape:
+            raise ValueError(f"{img_path} has size {arr.shape[1]}x{arr.shape[0]}, "
+                             f"expected {sum_arr.shape[1]}x{sum_arr.shape[0]}")
+        np.add(sum_arr, arr, out=sum_arr)
+        count += 1
+    return sum_arr, count
+
+def average_from_sum(sum_arr, count):
+    # Compute average (rounded to the nearest integer)
+    return ((sum_arr + count // 2) // count).astype(np.uint8)
+
+def average_snapshots(paths, workers=decode_workers, prefetch=prefetch, align=None):
+    sum_arr, count = sum_snapshots(paths, workers, prefetch, align=align)
+    return average_from_sum(sum_arr, count), count
+
+def file_signature(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+def registration_settings(align):
+    # how the summed frames were aligned: frames summed with other settings cannot be mixed with them
+    if align is None:
+        return {"register": False}
+    reference = os.path.abspath(align.name) if align.name else ""
+    return {"register": True, "reference": reference,
+            "reference_signature": file_signature(reference) if reference else None,
+            "register_scale": align.scale, "subpixel": align.subpixel}
+
+def load_state(path):
+    # (sum, count, manifest {file name: [size, mtime]}, registration settings) or None
+    if not path or not os.path.exists(path):
+        return None
+    with np.load(path) as state:
+        manifest = json.loads(str(state["manifest"]))
+        settings = json.loads(str(state["settings"])) if "settings" in state else None
+        return state["sum"], int(state["count"]), manifest, settings
+
+def save_state(path, sum_arr, count, manifest, settings):
+    # written next to the final file, then swapped in (a crash never leaves a half-written state)
+    tmp_path = path + ".tmp.npz"
+    np.savez(tmp_path, sum=sum_arr, count=count, manifest=json.dumps(manifest), settings=json.dumps(settings))
+    os.replace(tmp_path, path)
+
+def settled_snapshots(paths, seen, interval):
+    # snapshots ChimeraX has finished writing: same size and mtime as at the previous scan (`seen`, updated
+    # in place) or, at the first scan, not modified for `interval` seconds; the others wait for the next scan
+    first_scan = not seen
+    now = time.time_ns()
+    current = {}
+    for p in paths:
+        try:
+            current[p] = file_signature(p)
+        except FileNotFoundError:
+            continue # removed since the listing
+    settled = {p for p, sig in current.items()
+               if seen.get(p) == sig or (first_scan and now - sig[1] >= interval * 1e9)}
+    seen.clear()
+    seen.update(current)
+    return settled
+
+def incremental_average(paths, state_path, workers=decode_workers, prefetch=prefetch, align=None, settled=None):
+    # returns (average or None if nothing is summed yet, count, number of newly decoded snapshots)
+    # settled: the new snapshots that may be decoded now (None = all of them)
+    signatures = {os.path.basename(p): file_signature(p) for p in paths}
+    settings = registration_settings(align)
+    state = load_state(state_path)
+    sum_arr, count, manifest = None, 0, {}
+    if state is not None:
+        sum_arr, count, manifest, saved_settings = state
+        changed = [name for name, sig in manifest.items() if signatures.get(name) != sig]
+        if saved_settings != settings:
+            # the saved sum was aligned differently (or not at all): it cannot take these frames
+            print("The registration settings changed since the last run, rebuilding ..")
+            sum_arr, count, manifest = None, 0, {}
+        elif changed:
+            # a summed snapshot was modified or removed: its old pixels cannot be taken back out
+            print(f"{len(changed)} snapshots changed since the last run (e.g. {changed[0]}), rebuilding ..")
+            sum_arr, count, manifest = None, 0, {}
+
+    new_paths = [p for p in paths if os.path.basename(p) not in manifest and (settled is None or p in settled)]
+    if new_paths:
+        sum_arr, added = sum_snapshots(new_paths, workers, prefetch, sum_arr, align)
+        count += added
+        manifest.update({os.path.basename(p): signatures[os.path.basename(p)] for p in new_paths})
+        save_state(state_path, sum_arr, count, manifest, settings)
+    if not count:
+        return None, 0, 0
+    return average_from_sum(sum_arr, count), count, len(new_paths)
+
+def snapshot_statistics(paths, workers=decode_workers, prefetch=prefetch, stats=("variance", "min", "max"),
+                        align=None):
+    # one streaming pass: Welford updates of float32 mean and M2, in-place min/max
+    mean = m2 = delta = scratch = min_arr = max_arr = None
+    count = 0
+    need_m2 = "variance" in stats or "std" in stats
+
+    for img_path, arr in iter_frames(paths, workers, prefetch, align):
+        if mean is None:
+            mean = np.zeros(arr.shape, dtype=np.float32)
+            delta = np.empty_like(mean)
+            scratch = np.empty_like(mean)
+            m2 = np.zeros_like(mean) if need_m2 else None
+            min_arr = arr.copy() if "min" in stats else None
+            max_arr = arr.copy() if "max" in stats else None
+        elif arr.shape != mean.shape:
+            raise ValueError(f"{img_path} has size {arr.shape[1]}x{arr.shape[0]}, "
+                             f"expected {mean.shape[1]}x{mean.shape[0]}")
+        count += 1
+        np.subtract(arr, mean, out=delta)            # delta = x - mean_old
+        np.multiply(delta, 1.0 / count, out=scratch)
+        mean += scratch                              # mean_new = mean_old + delta / n
+        if need_m2:
+            np.subtract(arr, mean, out=scratch)
+            scratch *= delta
+            m2 += scratch                            # M2 += delta * (x - mean_new)
+        if min_arr is not None:
+            np.minimum(min_arr, arr, out=min_arr)
+        if max_arr is not None:
+            np.maximum(max_arr, arr, out=max_arr)
+
+    results = {"mean": np.clip(np.rint(mean), 0, 255).astype(np.uint8)}
+    if need_m2:
+        variance = m2 / count
+        if "variance" in stats:
+            results["variance"] = variance
+        if "std" in stats:
+            results["std"] = np.sqrt(variance)
+    if min_arr is not None:
+        results["min"] = min_arr
+    if max_arr is not None:
+        results["max"] = max_arr
+    return results, count
+
+def sliding_average(paths, window, workers=decode_workers, prefetch=prefetch, align=None):
+    # yields (index, average of the snapshots index-before .. index+after), in order;
+    # the window is truncated at both ends of the sequence
+    if window < 1:
+        raise ValueError("The window must hold at least one snapshot")
+    before = (window - 1) // 2
+    after = window - 1 - before
+    ring = sum_arr = out = None
+    total = 0
+
+    def emit(i, lo):
+        # average of the frames lo .. min(i + after, total - 1)
+        count = min(i + after, total - 1) - lo + 1
+        np.add(sum_arr, count // 2, out=out)
+        np.floor_divide(out, count, out=out)
+        return i, out.astype(np.uint8)
+
+    for j, (img_path, arr) in enumerate(iter_frames(paths, workers, prefetch, align)):
+        if ring is None:
+            ring = np.empty((window,) + arr.shape, dtype=np.uint8) # the last K decoded snapshots
+            sum_arr = np.zeros(arr.shape, dtype=np.uint32)
+            out = np.empty_like(sum_arr)
+        elif arr.shape != sum_arr.shape:
+            raise ValueError(f"{img_path} has size {arr.shape[1]}x{arr.shape[0]}, "
+                             f"expected {sum_arr.shape[1]}x{sum_arr.shape[0]}")
+        if j >= window:
+            sum_arr -= ring[j % window] # snapshot j - K leaves the window
+        ring[j % window] = arr
         sum_arr += arr
-    
-    count += 1
+        total = j + 1
+        if j >= after:
+            yield emit(j - after, max(0, j - after - before))
 
-# Compute average
-avg_arr = sum_arr / count
+    # the last frames: the window shrinks at the end of the sequence
+    for i in range(max(0, total - after), total):
+        drop = i - before - 1
+        if drop >= 0 and drop >= total - window:
+            sum_arr -= ring[drop % window]
+        yield emit(i, max(0, i - before))
 
-# Convert average to the numpy array
-avg_arr = np.clip(avg_arr, 0, 255).astype(np.uint8)
+def save_sliding_average(paths, window, frames_dir=blur_dir, workers=decode_workers, prefetch=prefetch,
+                         align=None):
+    # every frame is written as soon as it is produced
+    os.makedirs(frames_dir, exist_ok=True)
+    saved = []
+    for i, avg_arr in sliding_average(paths, window, workers, prefetch, align):
+        name = os.path.splitext(os.path.basename(paths[i]))[0]
+        path = os.path.join(frames_dir, f"blur_{i:05d}_{name}.png")
+        Image.fromarray(avg_arr).save(path)
+        saved.append(path)
+    return saved
 
-avg_img = Image.fromarray(np.uint8(avg_arr)).convert("RGBA")
-# scape image
-scale_factor = 3  # e.g., triple the dimensions
-new_size = (avg_img.width * scale_factor, avg_img.height * scale_factor)
-avg_img = avg_img.resize(new_size, Image.LANCZOS)  # high-quality resampling
-# Convert back to image
-avg_img = avg_img.resize(new_size, Image.LANCZOS)  # upscale
+def save_statistic(arr, path, name, style=stats_style, cmap=colormap):
+    if name in ("min", "max"):
+        Image.fromarray(arr).save(path)
+        return path
+    rgb = arr[..., :3] # the spread of the alpha channel is not shown
+    if style == "heatmap":
+        import matplotlib
+        values = rgb.mean(axis=-1)
+        values = values / values.max() if values.max() > 0 else values
+        colored = matplotlib.colormaps[cmap](values, bytes=True)
+        Image.fromarray(colored).save(path)
+    elif style == "image":
+        scaled = rgb / rgb.max() * 255 if rgb.max() > 0 else rgb
+        Image.fromarray(np.rint(scaled).astype(np.uint8)).save(path)
+    else:
+        raise ValueError(f"Unknown statistics style: {style}")
+    return path
 
-# Save the average snapshot
-avg_img_path = "./average_structure.png"
-avg_img.save(avg_img_path)
+def save_average(avg_arr, path, scale_factor=scale_factor):
+    avg_img = Image.fromarray(avg_arr)
+    # scape image
+    if scale_factor != 1:
+        new_size = (avg_img.width * scale_factor, avg_img.height * scale_factor)
+        avg_img = avg_img.resize(new_size, Image.LANCZOS)  # high-quality resampling
+    # Save the average snapshot
+    avg_img.save(path)
+    return avg_img
+
+def show_image(img):
+    # and display it using GUI
+    import matplotlib.pyplot as plt
+    plt.imshow(img)
+    plt.axis("off")
+    plt.show()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Average any number of MD snapshots")
+    parser.add_argument("folder", nargs="?", default=folder_path)
+    parser.add_argument("-o", "--output", default=avg_img_path)
+    parser.add_argument("--scale", type=int, default=scale_factor, help="upscaling factor of the output")
+    parser.add_argument("--workers", type=int, default=decode_workers, help="decoding threads")
+    parser.add_argument("--prefetch", type=int, default=prefetch, help="max decoded images in flight")
+    parser.add_argument("--headless", action="store_true", help="do not display the result")
+    parser.add_argument("--stats", nargs="*", default=extra_stats, choices=["variance", "std", "min", "max"],
+                        help="extra per-pixel maps computed in the same pass")
+    parser.add_argument("--stats-style", default=stats_style, choices=["heatmap", "image"])
+    parser.add_argument("--colormap", default=colormap, help="matplotlib colormap of the heatmaps")
+    parser.add_argument("--window", type=int, default=window_size,
+                        help="sliding-window mode: one frame per snapshot averaging K neighbours")
+    parser.add_argument("--frames-dir", default=blur_dir, help="output folder of the sliding-window frames")
+    parser.add_argument("--state", default=state_path,
+                        help="keep the running sum here and decode only new snapshots on re-runs")
+    parser.add_argument("--watch", type=float, default=watch_interval,
+                        help="with --state: rescan the folder every N seconds and refresh the average")
+    parser.add_argument("--register", action="store_true", default=register,
+                        help="align the snapshots on a reference (FFT phase correlation) before averaging")
+    parser.add_argument("--register-scale", type=int, default=register_scale,
+                        help="luminance downsampling factor used for the registration")
+    parser.add_argument("--reference", default=register_reference, help="reference snapshot (default: the first one)")
+    parser.add_argument("--whole-pixels", action="store_true", default=not register_subpixel,
+                        help="registration shifts rounded to whole pixels (faster, no interpolation)")
+    args = parser.parse_args(argv)
+
+    paths = list_snapshots(args.folder)
+    # total number of images found:
+    print(f"Detected {len(paths)} images. Starting processing ..")
+    print(f"KEEP YOU PATIENCE!")
+
+    align = None
+    if args.register:
+        reference = args.reference or paths[0]
+        align = PhaseCorrelator(decode_snapshot(reference), args.register_scale, not args.whole_pixels,
+                                name=reference)
+
+    if args.window:
+        saved = save_sliding_average(paths, args.window, args.frames_dir, args.workers, args.prefetch, align)
+        print(f"{len(saved)} motion-blur frames (window of {args.window}) saved to {args.frames_dir}")
+        return saved
+
+    if args.state:
+        seen = {} # file signatures of the previous scan (watch mode)
+        while True:
+            # when watching, snapshots still being written are left for a later scan
+            settled = settled_snapshots(paths, seen, args.watch) if args.watch else None
+            try:
+                avg_arr, count, added = incremental_average(paths, args.state, args.workers, args.prefetch, align,
+                                                            settled)
+            except OSError as e:
+                # a snapshot that could not be decoded (e.g. writing paused for longer than a scan):
+                # the state is only saved after a complete pass, so the same snapshots are retried next scan
+                if not args.watch:
+                    raise
+                print(f"Could not read the new snapshots ({e}), retrying at the next scan ..")
+            else:
+                if avg_arr is None:
+                    print("Waiting for the first complete snapshot ..")
+                elif added or not os.path.exists(args.output):
+                    save_average(avg_arr, args.output, args.scale)
+                    print(f"Average of {count} images ({added} new) saved to {args.output}")
+                elif not args.watch:
+                    print(f"No new snapshots, the average of {count} images is up to date")
+            if not args.watch:
+                break
+            try:
+                time.sleep(args.watch)
+            except KeyboardInterrupt:
+                break
+            paths = list_snapshots(args.folder)
+        if not args.headless and not args.watch:
+            show_image(Image.open(args.output))
+        return args.output
+
+    if args.stats:
+        results, count = snapshot_statistics(paths, args.workers, args.prefetch, args.stats, align)
+        avg_arr = results["mean"]
+        base, ext = os.path.splitext(args.output)
+        for name in args.stats:
+            path = save_statistic(results[name], f"{base}_{name}{ext or '.png'}", name,
+                                  args.stats_style, args.colormap)
+            print(f"{name} map saved to {path}")
+    else:
+        avg_arr, count = average_snapshots(paths, args.workers, args.prefetch, align)
+    avg_img = save_average(avg_arr, args.output, args.scale)
+    print(f"Average of {count} images saved to {args.output}")
 
-# and display it using GUI
-plt.imshow(avg_img)
-plt.axis("off")
-plt.show()
+    if not args.headless:
+        show_image(avg_img)
+    return args.output
 
-avg_img_path
\ No newline at end of file
+if __name__ == "__main__":
+    main()
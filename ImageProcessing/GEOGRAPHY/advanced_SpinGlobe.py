@@ -6,37 +6,43 @@ import geopandas as gpd
 import cartopy.crs as ccrs
 import cartopy.feature as cfeature
 import numpy as np
-import imageio
 import os
 import requests
 import zipfile
 import shutil
-from PIL import Image
-from scipy.ndimage import gaussian_filter
 import matplotlib
 import matplotlib.ticker as mticker
 #matplotlib.use('Agg') #disable matplotlib gui
 import matplotlib.pyplot as plt
-import io
-from PIL import Image, ImageDraw
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from fast_globe import FastGlobe, GlobeIndex, OrthoClouds
+from clouds import cloud_texture
+from frame_stream import FrameWriter, canvas_frame
 
 # ==== CONFIGURATION ====
 FULL_ROTATION = True  # True = full 360° spin, False = swing left/right
 EXTRA_CFEATURE = False # Experimental
 SHOW_CLOUDS = False # Experimental
-ENCODE_WITH_PIL = True
+CLOUD_DRIFT = 0.5 # degrees per frame the clouds drift east over the ground
+CLOUD_SEED = 123 # the same clouds in every worker (and every run)
+SAVE_FRAMES = False # also keep every frame as a PNG in FRAMES_DIR (the animation does not need them)
+WORKERS = os.cpu_count() or 1 # frames rendered in parallel processes (1 = in this process)
+RENDER_ENGINE = "cartopy" # "cartopy" or "fast" (fast_globe.py: numpy + PIL, milliseconds per frame, no cfeatures)
 
 # Input / Output
-OUTPUT_GIF = "OUTPUT.gif"
+OUTPUT_GIF = "OUTPUT.gif" # .gif, .png / .apng (animated PNG) or .mp4
 FRAMES_DIR = "frames"
 
 # IMAGE OPTIONS
 DPI = 100
+GLOBE_SIZE = 10 * DPI # fast engine: frame size in px (the cartopy figure is 10x10 inches)
 
 # MAP OPTION
 lat_center = 20  # tilt to put Europe a bit lower
 GRID_SPACING = 15 # default is 30
 MAP_RESOLUTION = "50m"   # options: "110m", "50m", "10m"
+CULL_AND_SIMPLIFY = True # draw only countries facing the viewer, simplified to the pixel size (10m as fast as 110m)
 
 # VIDEO OPTIONS: 240 frames with 30 FPS => 8 sec animation
 FPS = 30
@@ -63,17 +69,12 @@ GRID_COLOR = "#1f78b4"  # a nice blue for the grid
 BG_COLOR = "white"
 ALPHA = 0.8
 
-# ==== PREPARE FRAMES FOLDER ====
-if os.path.exists(FRAMES_DIR):
-    shutil.rmtree(FRAMES_DIR)
-os.makedirs(FRAMES_DIR)
-
 # ==== DOWNLOAD SHAPEFILE IF MISSING ====
 shapefile_dir = "naturalearth"
 shapefile_name = f"ne_{MAP_RESOLUTION}_admin_0_countries.shp"
 shapefile_path = os.path.join(shapefile_dir, shapefile_name)
 
-if not os.path.exists(shapefile_path):
+def download_shapefile():
     print(f"Downloading Natural Earth {MAP_RESOLUTION} data...")
     url = f"https://naturalearth.s3.amazonaws.com/{MAP_RESOLUTION}_cultural/ne_{MAP_RESOLUTION}_admin_0_countries.zip"
     os.makedirs(shapefile_dir, exist_ok=True)
@@ -92,23 +93,47 @@ if not os.path.exists(shapefile_path):
     os.remove(zip_path)
 
 # ==== LOAD WORLD MAP ====
-world = gpd.read_file(shapefile_path)
-world["color"] = [PAIRED_12[i % len(PAIRED_12)] for i in range(len(world))]
-
-# ==== CREATE FRAMES ====
-# Fix random seed for clouds
-#np.random.seed(123) 
-
-frames = []
-if FULL_ROTATION:
-    longitudes = np.linspace(-20, 340, N_FRAMES)
-else:
-    swing_range = 30
-    center_lon = 10
-    longitudes = center_lon + swing_range * np.sin(np.linspace(0, 2 * np.pi, N_FRAMES))
-
-for i, lon in enumerate(longitudes):
-    fig = plt.figure(figsize=(10, 10))
+def load_world():
+    world = gpd.read_file(shapefile_path)
+    world["color"] = [PAIRED_12[i % len(PAIRED_12)] for i in range(len(world))]
+    return world
+
+# ==== FRAME WORKERS ====
+# every worker process loads the world (and builds the fast globe) once, then renders frames by index
+_world = None
+_globe = None
+_index = None
+_clouds = None
+_ortho_clouds = None
+
+def init_worker():
+    global _world, _globe, _index, _clouds, _ortho_clouds
+    matplotlib.use('Agg') # workers never show figures
+    _world = load_world()
+    if SHOW_CLOUDS:
+        _clouds = cloud_texture(seed=CLOUD_SEED) # seamless in longitude, built once
+    if RENDER_ENGINE == "fast":
+        # country rings flattened once, line widths converted from points to pixels
+        _globe = FastGlobe(_world.geometry, _world["color"], size=GLOBE_SIZE,
+                           ocean_color=OCEAN_COLOR, bg_color=BG_COLOR, edge_color=EDGES_COLOR,
+                           edge_width=EDGES_WIDTH * DPI / 72, alpha=ALPHA,
+                           grid_spacing=GRID_SPACING, grid_color=GRID_COLOR, grid_alpha=0.5, grid_width=0.8 * DPI / 72,
+                           simplify=CULL_AND_SIMPLIFY, clouds=_clouds)
+    else:
+        if CULL_AND_SIMPLIFY:
+            # bounding caps + simplification levels of every country, computed once per worker
+            _index = GlobeIndex(_world.geometry)
+        if SHOW_CLOUDS:
+            # clouds sampled straight into the orthographic frame (half resolution: they are smooth)
+            _ortho_clouds = OrthoClouds(_clouds, GLOBE_SIZE // 2)
+
+def render_frame(job):
+    # (frame index, central longitude) -> RGB(A) frame as a numpy array
+    i, lon = job
+    if RENDER_ENGINE == "fast":
+        return np.asarray(_globe.render(lon, lat_center, cloud_offset=i * CLOUD_DRIFT))
+
+    fig = plt.figure(figsize=(10, 10), dpi=DPI)
     ax = plt.axes(projection=ccrs.Orthographic(central_longitude=lon, central_latitude=lat_center))
     ax.patch.set_facecolor(OCEAN_COLOR) # fix the gap in the top edge
     ax.spines['geo'].set_edgecolor(OCEAN_COLOR)
@@ -132,31 +157,10 @@ for i, lon in enumerate(longitudes):
         #ax.add_feature(cfeature.LAND, facecolor=LAND_COLOR) 
 
     if SHOW_CLOUDS:
-        lon_grid, lat_grid = np.meshgrid(np.linspace(-180, 180, 800), np.linspace(-90, 90, 400))
-
-        # Large scale smooth noise (big clouds)
-        noise_big = np.random.rand(lat_grid.shape[0], lon_grid.shape[1])
-        clouds_big = gaussian_filter(noise_big, sigma=20)
-
-        # Smaller scale details (smaller cloud texture)
-        noise_small = np.random.rand(lat_grid.shape[0], lon_grid.shape[1])
-        clouds_small = gaussian_filter(noise_small, sigma=5)
-
-        # Combine noises (weighted)
-        clouds_combined = 0.7 * clouds_big + 0.3 * clouds_small
-
-        # Normalize combined clouds
-        clouds_norm = (clouds_combined - clouds_combined.min()) / (clouds_combined.max() - clouds_combined.min())
-
-        # Non-linear alpha curve (power curve) to highlight big clouds, reduce faint haze
-        cloud_alpha = clouds_norm ** 3 * 0.6  # power=3, max opacity 0.6
-
-        cloud_rgba = np.zeros((lat_grid.shape[0], lon_grid.shape[1], 4))
-        cloud_rgba[..., 0:3] = 1  # white clouds
-        cloud_rgba[..., 3] = cloud_alpha
-
-        ax.imshow(cloud_rgba, origin='upper', extent=[-180, 180, -90, 90],
-                transform=ccrs.PlateCarree(), zorder=5)
+        # already in the projection of the axes: drawn as is, no raster reprojection per frame
+        projection = ax.projection
+        ax.imshow(_ortho_clouds.render(lon, lat_center, i * CLOUD_DRIFT), origin='upper',
+                  extent=projection.x_limits + projection.y_limits, transform=projection, zorder=5)
 
     gl = ax.gridlines(draw_labels=False, color=GRID_COLOR, linewidth=0.8, linestyle='solid', alpha=0.5)
     gl.xlines = True
@@ -165,32 +169,58 @@ for i, lon in enumerate(longitudes):
     gl.xlocator = mticker.FixedLocator(np.arange(-180, 181, GRID_SPACING))  # 5° spacing instead of default 30°
     gl.ylocator = mticker.FixedLocator(np.arange(-90, 91, GRID_SPACING))
 
+    world = _world
+    if _index is not None:
+        # back-hemisphere countries dropped, the rest at the level matching the globe's pixel size
+        facing, geometries = _index.select(lon, lat_center, ax.get_window_extent().width / 2)
+        world = _world.iloc[facing].set_geometry(gpd.GeoSeries(geometries, index=_world.index[facing], crs=_world.crs))
     world.plot(ax=ax, transform=ccrs.PlateCarree(),
                color=world["color"], edgecolor=EDGES_COLOR, linewidth=EDGES_WIDTH, alpha=ALPHA)
 
     ax.set_global()
 
-    frame_path = os.path.join(FRAMES_DIR, f"frame_{i:03d}.png")
-    plt.savefig(frame_path, dpi=DPI, bbox_inches='tight') # sometimes remove for cool bbox_inches='tight'
+    frame = canvas_frame(fig, tight=True) # straight from the Agg buffer, cropped like bbox_inches='tight'
     plt.close(fig)
-    frames.append(imageio.imread(frame_path))
-
-# ==== SAVE GIF with infinite loop ====
-# encode with PIL
-if ENCODE_WITH_PIL:
-    pil_frames = [Image.fromarray(frame) for frame in frames]
-    pil_frames[0].save(
-        OUTPUT_GIF,
-        save_all=True,
-        append_images=pil_frames[1:],
-        duration=duration_per_frame * 1000,  # Pillow wants ms
-        loop=0
-    )
-# encode with imageio
-else:
-    with imageio.get_writer(OUTPUT_GIF, mode='I', duration=duration_per_frame, loop=0) as writer:
-        for frame in frames:
-            writer.append_data(frame)
-
-
-print(f"GIF saved as {OUTPUT_GIF}, frames stored in {FRAMES_DIR}/")
\ No newline at end of file
+    return frame
+
+def render_frames(longitudes, workers=WORKERS):
+    # yields the frames in index order whatever worker rendered them;
+    # only a few frames per worker are in flight, so memory does not grow with N_FRAMES
+    jobs = list(enumerate(longitudes))
+    if workers <= 1:
+        init_worker()
+        for job in jobs:
+            yield render_frame(job)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+        pending = deque()
+        for job in jobs:
+            pending.append(pool.submit(render_frame, job))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+if __name__ == "__main__":
+    # ==== PREPARE FRAMES FOLDER ====
+    if SAVE_FRAMES and os.path.exists(FRAMES_DIR):
+        shutil.rmtree(FRAMES_DIR)
+
+    if not os.path.exists(shapefile_path):
+        download_shapefile()
+
+    # ==== CREATE FRAMES ====
+    if FULL_ROTATION:
+        longitudes = np.linspace(-20, 340, N_FRAMES)
+    else:
+        swing_range = 30
+        center_lon = 10
+        longitudes = center_lon + swing_range * np.sin(np.linspace(0, 2 * np.pi, N_FRAMES))
+
+    # ==== RENDER + ENCODE (streamed, infinite loop) ====
+    print(f"Rendering {len(longitudes)} frames on {WORKERS} worker(s)...")
+    with FrameWriter(OUTPUT_GIF, FPS, loop=0, frames_dir=FRAMES_DIR if SAVE_FRAMES else None) as writer:
+        for frame in render_frames(longitudes):
+            writer.append(frame)
+
+    print(f"Animation saved as {OUTPUT_GIF}" + (f", frames stored in {FRAMES_DIR}/" if SAVE_FRAMES else ""))
@@ -0,0 +1,37 @@
+# Cloud layer for the spinning globes
+# One seamless cloud texture (equirectangular, periodic in longitude) is built once at startup;
+# every frame only shifts it by the drift offset, so the clouds move coherently instead of
+# flickering and cost almost nothing per frame.
+# (C) Visual Git Hub, 2025
+#
+# Usage:
+#   texture = cloud_texture(seed=123)                  # (400, 800, 4) uint8 RGBA, lon -180..180, lat 90..-90
+#   FastGlobe(..., clouds=texture).render(lon, lat, cloud_offset=i * 0.5)
+#   cartopy: fast_globe.OrthoClouds(texture, 500).render(lon, lat, i * 0.5) is already orthographic,
+#            draw it with ax.imshow(..., extent=proj.x_limits + proj.y_limits, transform=proj)
+#            (imshow of the equirectangular texture with transform=PlateCarree() reprojects it every frame)
+import numpy as np
+from scipy.ndimage import gaussian_filter
+
+def cloud_texture(width=800, height=400, seed=None, sigma_big=20, sigma_small=5, max_alpha=0.6, color=(255, 255, 255)):
+    rng = np.random.default_rng(seed)
+    # blur wraps around in longitude (seamless at the date line), reflects at the poles
+    modes = ("reflect", "wrap")
+
+    # Large scale smooth noise (big clouds)
+    clouds_big = gaussian_filter(rng.random((height, width)), sigma=sigma_big, mode=modes)
+
+    # Smaller scale details (smaller cloud texture)
+    clouds_small = gaussian_filter(rng.random((height, width)), sigma=sigma_small, mode=modes)
+
+    # Combine noises (weighted) and normalize
+    clouds_combined = 0.7 * clouds_big + 0.3 * clouds_small
+    clouds_norm = (clouds_combined - clouds_combined.min()) / (clouds_combined.max() - clouds_combined.min())
+
+    # Non-linear alpha curve (power curve) to highlight big clouds, reduce faint haze
+    cloud_alpha = clouds_norm ** 3 * max_alpha
+
+    texture = np.empty((height, width, 4), dtype=np.uint8)
+    texture[..., :3] = color
+    texture[..., 3] = np.rint(cloud_alpha * 255)
+    return texture
@@ -0,0 +1,204 @@
+# Streaming frame pipeline for the globe animations
+# Frames go straight from the renderer (matplotlib Agg canvas or fast_globe) into the encoder:
+# no PNG written and read back per frame, and memory does not grow with the number of frames.
+# Saving the frames as PNGs is optional, ping-pong loops replay the already-encoded frames.
+# (C) Visual Git Hub, 2025
+#
+# Usage:
+#   with FrameWriter("globe.gif", fps=30, frames_dir=None, bounce=False) as writer:
+#       for ...:
+#           writer.append(canvas_frame(fig))   # or writer.append(globe.render(lon, lat))
+#
+# Output format by extension: .gif (PIL), .png / .apng (animated PNG), .mp4 (imageio + ffmpeg)
+import io
+import os
+import struct
+import tempfile
+import zlib
+import numpy as np
+from PIL import Image, GifImagePlugin
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+def canvas_frame(fig, tight=True, pad_inches=0.1):
+    # RGB pixels of a matplotlib figure straight from its Agg buffer
+    # (tight=True crops like savefig(bbox_inches="tight"))
+    fig.canvas.draw()
+    rgba = np.asarray(fig.canvas.buffer_rgba())
+    if tight:
+        height, width = rgba.shape[:2]
+        bbox = fig.get_tightbbox(fig.canvas.get_renderer()).padded(pad_inches)
+        x0, y0 = max(0, round(bbox.x0 * fig.dpi)), max(0, round(height - bbox.y1 * fig.dpi))
+        rgba = rgba[y0:y0 + int(bbox.height * fig.dpi), x0:x0 + int(bbox.width * fig.dpi)]
+    return np.ascontiguousarray(rgba[..., :3])  # a copy: the buffer dies with the figure
+
+def as_rgb(frame):
+    if isinstance(frame, Image.Image):
+        frame = np.asarray(frame.convert("RGB"))
+    frame = np.asarray(frame)
+    if frame.ndim == 2:
+        frame = np.repeat(frame[..., None], 3, axis=2)
+    return np.ascontiguousarray(frame[..., :3], dtype=np.uint8)
+
+def fit_frame(rgb, shape):
+    # tight crops can differ by a pixel between frames: crop / pad (corner colour) to the first frame
+    if rgb.shape == shape:
+        return rgb
+    out = np.empty(shape, dtype=np.uint8)
+    out[...] = rgb[0, 0]
+    height, width = min(shape[0], rgb.shape[0]), min(shape[1], rgb.shape[1])
+    out[:height, :width] = rgb[:height, :width]
+    return out
+
+def png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+# ==== ENCODERS ====
+# encode(rgb) writes a frame and returns its payload, replay(payload) writes the same frame again
+class GifEncoder:
+    def __init__(self, path, fps, loop=0):
+        self.fp = open(path, "wb")
+        self.duration = 1000 / fps
+        self.loop = loop
+        self.started = False
+
+    def encode(self, rgb):
+        im = Image.fromarray(rgb).convert("P", palette=Image.Palette.ADAPTIVE)
+        if not self.started:
+            header, _ = GifImagePlugin.getheader(im, info={"loop": self.loop, "duration": self.duration})
+            self.fp.write(b"".join(header))
+            self.started = True
+        # every frame carries its own palette
+        payload = b"".join(GifImagePlugin.getdata(im, duration=self.duration, include_color_table=True))
+        self.fp.write(payload)
+        return payload
+
+    def replay(self, payload):
+        self.fp.write(payload)
+
+    def close(self):
+        self.fp.write(b";")
+        self.fp.close()
+
+class ApngEncoder:
+    # animated PNG written chunk by chunk, the frame count in acTL is patched on close
+    def __init__(self, path, fps, loop=0, compress_level=6):
+        self.fp = open(path, "wb")
+        self.delay = (max(1, round(1000 / fps)), 1000)
+        self.loop = loop
+        self.compress_level = compress_level
+        self.size = None
+        self.frames = 0
+        self.sequence = 0
+
+    def write_frame(self, data):
+        width, height = self.size
+        self.fp.write(png_chunk(b"fcTL", struct.pack(">IIIIIHHBB", self.sequence, width, height, 0, 0,
+                                                       *self.delay, 0, 0)))
+        self.sequence += 1
+        if self.frames == 0:
+            self.fp.write(png_chunk(b"IDAT", data))
+        else:
+            self.fp.write(png_chunk(b"fdAT", struct.pack(">I", self.sequence) + data))
+            self.sequence += 1
+        self.frames += 1
+
+    def encode(self, rgb):
+        # PIL encodes the frame as a PNG, its IHDR / IDAT chunks are lifted into the animation
+        buf = io.BytesIO()
+        Image.fromarray(rgb).save(buf, "PNG", compress_level=self.compress_level)
+        png, pos, header, data = buf.getvalue(), len(PNG_SIGNATURE), None, []
+        while pos < len(png):
+            length, kind = struct.unpack(">I4s", png[pos:pos + 8])
+            if kind == b"IHDR":
+                header = png[pos + 8:pos + 8 + length]
+            elif kind == b"IDAT":
+                data.append(png[pos + 8:pos + 8 + length])
+            pos += length + 12
+        data = b"".join(data)
+        if self.size is None:
+            self.size = (rgb.shape[1], rgb.shape[0])
+            self.fp.write(PNG_SIGNATURE + png_chunk(b"IHDR", header))
+            self.actl_offset = self.fp.tell()
+            self.fp.write(png_chunk(b"acTL", struct.pack(">II", 0, self.loop)))
+        self.write_frame(data)
+        return data
+
+    def replay(self, payload):
+        self.write_frame(payload)
+
+    def close(self):
+        if self.size is not None:
+            self.fp.write(png_chunk(b"IEND", b""))
+            self.fp.seek(self.actl_offset)
+            self.fp.write(png_chunk(b"acTL", struct.pack(">II", self.frames, self.loop)))
+        self.fp.close()
+
+class Mp4Encoder:
+    # ffmpeg (through imageio) encodes as the frames arrive
+    def __init__(self, path, fps, loop=0):
+        import imageio
+        self.writer = imageio.get_writer(path, fps=fps)
+        self.shape = None
+
+    def encode(self, rgb):
+        self.shape = rgb.shape
+        self.writer.append_data(rgb)
+        return rgb.tobytes()  # replayed without any decoding
+
+    def replay(self, payload):
+        self.writer.append_data(np.frombuffer(payload, dtype=np.uint8).reshape(self.shape))
+
+    def close(self):
+        self.writer.close()
+
+ENCODERS = {".gif": GifEncoder, ".png": ApngEncoder, ".apng": ApngEncoder, ".mp4": Mp4Encoder}
+
+class FrameWriter:
+    """
+    Streams frames into an animation as they are produced.
+
+    frames_dir: also save every frame as frame_XXX.png there (None = no files)
+    bounce: ping-pong loop, the frames are replayed backwards (without the first and the last one)
+            from a temporary spool of the encoded frames, nothing is rendered or decoded twice
+    """
+    def __init__(self, path, fps, loop=0, frames_dir=None, bounce=False):
+        ext = os.path.splitext(path)[1].lower()
+        if ext not in ENCODERS:
+            raise ValueError(f"Unsupported animation format: {ext} (use {', '.join(ENCODERS)})")
+        self.encoder = ENCODERS[ext](path, fps, loop)
+        self.frames_dir = frames_dir
+        if frames_dir:
+            os.makedirs(frames_dir, exist_ok=True)
+        self.spool = tempfile.TemporaryFile() if bounce else None
+        self.spooled = []  # (offset, length) of every encoded frame in the spool
+        self.shape = None
+        self.count = 0
+
+    def append(self, frame):
+        rgb = as_rgb(frame)
+        if self.shape is None:
+            self.shape = rgb.shape
+        rgb = fit_frame(rgb, self.shape)
+        if self.frames_dir:
+            Image.fromarray(rgb).save(os.path.join(self.frames_dir, f"frame_{self.count:03d}.png"))
+        payload = self.encoder.encode(rgb)
+        if self.spool is not None:
+            self.spooled.append((self.spool.tell(), len(payload)))
+            self.spool.write(payload)
+        self.count += 1
+
+    def close(self):
+        if self.spool is not None:
+            for offset, length in reversed(self.spooled[1:-1]):
+                self.spool.seek(offset)
+                self.encoder.replay(self.spool.read(length))
+                self.count += 1
+            self.spool.close()
+        self.encoder.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
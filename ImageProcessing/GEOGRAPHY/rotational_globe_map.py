@@ -2,8 +2,9 @@ import geopandas as gpd
 import matplotlib.pyplot as plt
 import cartopy.crs as ccrs
 import requests, zipfile, io, os
-import imageio
-from matplotlib.patches import Patch
+from PIL import Image, ImageDraw, ImageFont
+from fast_globe import FastGlobe
+from frame_stream import FrameWriter, canvas_frame
 
 PAIRED_12 = [
     "#a6cee3", "#1f78b4", "#b2df8a", "#33a02c",
@@ -26,30 +27,57 @@ world = gpd.read_file(shp_path)
 world = world.sort_values("NAME").reset_index(drop=True)
 world["plot_color"] = [PAIRED_12[i % len(PAIRED_12)] for i in range(len(world))]
 
-# Create frames folder
+# Frames go straight from the figure canvas into the GIF; set save_frames to also keep them as PNGs
 frames_folder = "frames"
-os.makedirs(frames_folder, exist_ok=True)
+save_frames = False
+gif_path = "rotating_globe.gif"
+
+# "fast": fast_globe.py draws the frames (numpy + PIL, milliseconds per frame)
+# "cartopy": a matplotlib figure with cartopy axes per frame (all countries in one add_geometries call)
+render_engine = "fast"
+dpi = 150
 
 # Parameters for animation
 num_frames = 36  # number of frames for full rotation (360 degrees / 10° per frame)
 alpha = 0.8      # transparency on countries
 
-filenames = []
+def titled(globe_image, title, font_size=14 * dpi // 72):
+    # the fast frame with its title on top, like plt.title
+    font = ImageFont.load_default(size=font_size)
+    strip = 2 * font_size
+    frame = Image.new("RGB", (globe_image.width, globe_image.height + strip), "white")
+    ImageDraw.Draw(frame).text((globe_image.width / 2, strip / 2), title, fill="black", font=font, anchor="mm")
+    frame.paste(globe_image, (0, strip))
+    return frame
+
+if render_engine == "fast":
+    # the countries are flattened once, line widths converted from points to pixels
+    globe = FastGlobe(world.geometry, world["plot_color"], size=1000, ocean_color="white", bg_color="white",
+                      edge_color="black", edge_width=0.4 * dpi / 72, alpha=alpha,
+                      grid_spacing=30, grid_color="blue", grid_alpha=0.5, grid_width=0.7 * dpi / 72,
+                      outline_color="black", outline_width=dpi / 72)
+else:
+    plot_colors = dict(zip(world.geometry, world["plot_color"]))
+
+writer = FrameWriter(gif_path, fps=10, loop=0, frames_dir=frames_folder if save_frames else None)
 
 for i in range(num_frames):
     central_lon = (i * 10) % 360 - 180  # rotate from -180 to 180 degrees
-    
+    title = f"Spinning Paired Palette - Frame {i+1}/{num_frames}"
+
+    if render_engine == "fast":
+        writer.append(titled(globe.render(central_lon, 0), title))
+        continue
+
     proj = ccrs.Orthographic(central_longitude=central_lon, central_latitude=0)
     
-    fig = plt.figure(figsize=(8,8))
+    fig = plt.figure(figsize=(8,8), dpi=dpi)
     ax = plt.axes(projection=proj)
     
-    # Plot countries with colors and alpha
-    for idx, row in world.iterrows():
-        geom = row['geometry']
-        ax.add_geometries([geom], crs=ccrs.PlateCarree(),
-                          facecolor=row['plot_color'], edgecolor='black',
-                          linewidth=0.4, alpha=alpha)
+    # Plot countries with colors and alpha: one artist, drawn as one collection per palette colour
+    ax.add_geometries(world.geometry, crs=ccrs.PlateCarree(),
+                      styler=lambda geom: {"facecolor": plot_colors[geom]}, edgecolor='black',
+                      linewidth=0.4, alpha=alpha)
     
     # Add gridlines
     gl = ax.gridlines(draw_labels=False, linewidth=0.7, color='blue', alpha=0.5, linestyle='--')
@@ -59,20 +87,11 @@ for i in range(num_frames):
     ax.patch.set_edgecolor('black')
     ax.patch.set_linewidth(1)
     
-    plt.title(f"Spinning Paired Palette - Frame {i+1}/{num_frames}", fontsize=14)
+    plt.title(title, fontsize=14)
     
-    # Save frame
-    filename = os.path.join(frames_folder, f"frame_{i:02d}.png")
-    plt.savefig(filename, dpi=150, bbox_inches='tight')
+    # Add frame
+    writer.append(canvas_frame(fig)) # cropped like bbox_inches='tight'
     plt.close(fig)
-    
-    filenames.append(filename)
-
-# Create GIF
-gif_path = "rotating_globe.gif"
-with imageio.get_writer(gif_path, mode='I', duration=0.1, loop=0) as writer:
-    for filename in filenames:
-        image = imageio.imread(filename)
-        writer.append_data(image)
 
+writer.close()
 print(f"Saved animated GIF as {gif_path}")
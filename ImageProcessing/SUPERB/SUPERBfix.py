@@ -1,13 +1,32 @@
 # SUPERB - creating SUPER Baner via multiple image mixing
 # Created by Gleb Novikov
 # (c) The Visual Hub 2025
+#
+# Usage: python SUPERBfix.py                                   -> one banner from the configuration below
+#        python SUPERBfix.py --batch specs.json --workers 4    -> many banners (one JSON spec per banner)
+#
+# Batch specs: a JSON list, every spec overrides the configuration (lower-case keys), e.g.
+#   [{"banner": "banner.png", "images": "small_images", "output": "wide.png", "rows": 1},
+#    {"banner": "square.png", "images": ["a.png", "b.png", "c.png", "d.png"], "output": "grid.png",
+#     "rows": 2, "auto_fit": true, "border_color": "#D4AF37"}]   (or "border_color": [212, 175, 55])
+# Relative paths are resolved from the folder of the specs file.
+# Every source image is decoded only once per batch: all the sizes it is needed at are fitted
+# from that decode into a shared cache, then the banners are composed in a process pool.
 
 import os
-from PIL import Image, ImageDraw, ImageOps
+import json
+import math
+import shutil
+import hashlib
+import argparse
+import tempfile
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image, ImageColor, ImageOps
 
 # === CONFIGURATION ===
 BORDER_WIDTH     = 2                 # thickness of the golden ring (px)
-BORDER_SCALE     = 32                 # border supersampling
 BORDER_COLOR     = "black"         # gold - #D4AF37, white #FFFFFF, royal blue- #4169E1
 TARGET_IMG_SIZE  = 280               # DIAMETER of each round framed image (px)
 HORIZONTAL_SHIFT = 50                # shift the whole row to the right (px)
@@ -15,86 +34,219 @@ IMAGE_SPACING    = 330               # distance between centers of consecutive i
 VERTICAL_NUDGE   = 0                 # vertical alignment INSIDE the circle (px). +down, -up
 IMAGE_ZOOM       = 1.0               # zoom of images inside circles: 1 = original, 0.9 = smaller, 1.1 = bigger
 
+# === LAYOUT ===
+ROWS             = 1                 # images are spread over this many rows (top rows get the extra image)
+ROW_SPACING      = 330               # distance between centers of consecutive rows (px)
+AUTO_FIT         = False             # True -> images evenly spread over the banner (smaller if needed)
+FIT_MARGIN       = 20                # auto-fit: free space along the banner edges (px)
+FIT_GAP          = 10                # auto-fit: minimal space between two circles (px)
+
 BANNER_PATH          = "banner.png"
 SMALL_IMAGES_FOLDER  = "small_images"
 OUTPUT_PATH          = "banner_with_framed_images.png"
-
-# === LOAD SMALL IMAGES ===
-script_dir = os.path.dirname(os.path.abspath(__file__))
-images_dir = os.path.join(script_dir, SMALL_IMAGES_FOLDER)
-
+DPI                  = 100
+
+# spec keys -> defaults (the configuration above)
+SPEC_DEFAULTS = {
+    "border_width": BORDER_WIDTH, "border_color": BORDER_COLOR, "target_img_size": TARGET_IMG_SIZE,
+    "horizontal_shift": HORIZONTAL_SHIFT, "image_spacing": IMAGE_SPACING, "vertical_nudge": VERTICAL_NUDGE,
+    "image_zoom": IMAGE_ZOOM, "rows": ROWS, "row_spacing": ROW_SPACING, "auto_fit": AUTO_FIT,
+    "fit_margin": FIT_MARGIN, "fit_gap": FIT_GAP, "dpi": DPI,
+}
 valid_ext = {".png", ".jpg", ".jpeg"}
-small_images = sorted([
-    os.path.join(images_dir, f) for f in os.listdir(images_dir)
-    if os.path.splitext(f.lower())[1] in valid_ext
-])
 
-small_images = sorted([
-    os.path.join(images_dir, f) for f in os.listdir(images_dir)
-    if os.path.splitext(f.lower())[1] in valid_ext
-])
-
-num_images = len(small_images)
-
-# === PROCESSING ===
-banner = Image.open(os.path.join(script_dir, BANNER_PATH)).convert("RGBA")
-banner_width, banner_height = banner.size
-
-# Prepare row layout using IMAGE_SPACING between image centers
-n = len(small_images)
-total_center_span = (n - 1) * IMAGE_SPACING
-row_center_y = banner_height // 2
-start_center_x = (banner_width - total_center_span) // 2 + HORIZONTAL_SHIFT
+# === TEMPLATES ===
+# Ring and circular mask are the same for every image: rendered once, anti-aliased analytically
+# (pixel coverage from the distance to the centre, no supersampled canvas)
+def circle_coverage(size, radius):
+    # fraction of every pixel inside a circle centred on the canvas (1 px linear edge)
+    centers = np.arange(size, dtype=np.float32) + 0.5 - size / 2
+    dist = np.sqrt(centers[:, None] ** 2 + centers[None, :] ** 2)
+    return np.clip(radius - dist + 0.5, 0.0, 1.0)
+
+@lru_cache(maxsize=16)
+def ring_template(size, width, color):
+    # RGBA ring between radius size/2 - width and size/2, color as an (R, G, B) tuple
+    outer = size / 2
+    coverage = circle_coverage(size, outer) - circle_coverage(size, max(0.0, outer - width))
+    ring = np.zeros((size, size, 4), dtype=np.uint8)
+    ring[..., :3] = color
+    ring[..., 3] = np.rint(coverage * 255).astype(np.uint8)
+    return Image.fromarray(ring)
+
+@lru_cache(maxsize=16)
+def disk_mask(size):
+    # "L" alpha mask of the inscribed disk
+    return Image.fromarray(np.rint(circle_coverage(size, size / 2) * 255).astype(np.uint8))
+
+# === LAYOUT ENGINE ===
+def layout_centers(n, banner_size, spec):
+    # returns (diameter, [(center_x, center_y), ...]) for n framed images on the banner
+    banner_width, banner_height = banner_size
+    diameter = spec["target_img_size"]
+    rows = max(1, min(spec["rows"], n))
+    per_row = math.ceil(n / rows)
+    rows = math.ceil(n / per_row)  # e.g. 4 images asked in 3 rows fill only 2 (2 + 2): no empty row
+    spacing, row_spacing, shift = spec["image_spacing"], spec["row_spacing"], spec["horizontal_shift"]
+
+    if spec["auto_fit"]:
+        margin, gap = spec["fit_margin"], spec["fit_gap"]
+        # the banner (minus margins) is split into equal cells, one circle in the middle of each;
+        # circles shrink only if they do not fit into their cell
+        spacing = (banner_width - 2 * margin) / per_row
+        row_spacing = (banner_height - 2 * margin) / rows
+        diameter = int(min(diameter, spacing - gap, row_spacing - gap))
+        if diameter < 2 * spec["border_width"] + 1:
+            raise ValueError(f"{n} images in {rows} rows do not fit on a {banner_width}x{banner_height} banner")
+        shift = 0
+
+    # Prepare row layout using IMAGE_SPACING between image centers, rows centered on the banner
+    centers = []
+    first_row_y = (banner_height - (rows - 1) * row_spacing) / 2
+    for row in range(rows):
+        count = min(per_row, n - row * per_row)
+        total_center_span = (count - 1) * spacing
+        start_center_x = math.floor((banner_width - total_center_span) / 2) + shift
+        center_y = math.floor(first_row_y + row * row_spacing)
+        centers.extend((round(start_center_x + i * spacing), center_y) for i in range(count))
+    return diameter, centers
+
+def inner_size(diameter, spec):
+    # inner area (where the actual photo goes), scaled by zoom
+    return max(1, int((diameter - 2 * spec["border_width"]) * spec["image_zoom"]))
+
+# === SOURCE IMAGES ===
+def list_small_images(images):
+    # a folder (all images inside, sorted) or an explicit list of files
+    if isinstance(images, str):
+        return sorted(
+            os.path.join(images, f) for f in os.listdir(images)
+            if os.path.splitext(f.lower())[1] in valid_ext
+        )
+    return list(images)
+
+def fit_source(src, inner_diameter):
+    # Fit/crop the source image to a perfect square of inner_diameter
+    return ImageOps.fit(src, (inner_diameter, inner_diameter), method=Image.LANCZOS, centering=(0.5, 0.5))
 
-# Precompute inner area (where the actual photo goes)
-inner_diameter = max(1, int((TARGET_IMG_SIZE - 2 * BORDER_WIDTH) * IMAGE_ZOOM))  # scaled by zoom
+def fitted_name(img_path, inner_diameter):
+    st = os.stat(img_path)
+    key = f"{os.path.abspath(img_path)}|{st.st_size}|{st.st_mtime_ns}|{inner_diameter}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest() + ".npy"
 
-for i, img_path in enumerate(small_images):
+def fit_all_sizes(job):
+    # one decode of the source, one fitted square per requested size, saved into the shared cache
+    img_path, sizes, cache_dir = job
     src = Image.open(img_path).convert("RGBA")
+    for inner_diameter in sizes:
+        np.save(os.path.join(cache_dir, fitted_name(img_path, inner_diameter)),
+                np.asarray(fit_source(src, inner_diameter)))
+    return img_path
 
-    # Fit/crop the source image to a perfect square of inner_diameter
-    inner_sq = ImageOps.fit(src, (inner_diameter, inner_diameter),
-                            method=Image.LANCZOS, centering=(0.5, 0.5))
-
-    # Make it circular via alpha mask
-    mask = Image.new("L", (inner_diameter, inner_diameter), 0)
-    draw_mask = ImageDraw.Draw(mask)
-    draw_mask.ellipse((0, 0, inner_diameter - 1, inner_diameter - 1), fill=255)
-    inner_sq.putalpha(mask)
-
-    # Create the framed circle canvas (full target diameter)
-    large_size = TARGET_IMG_SIZE * BORDER_SCALE
-    large_framed = Image.new("RGBA", (large_size, large_size), (0,0,0,0))
-    
-    # === Create border with supersampling ===
-    large_size = TARGET_IMG_SIZE * BORDER_SCALE
-    large_framed = Image.new("RGBA", (large_size, large_size), (0,0,0,0))
-    draw_border = ImageDraw.Draw(large_framed)
-    draw_border.ellipse(
-        (0, 0, large_size-1, large_size-1),
-        outline=BORDER_COLOR, width=BORDER_WIDTH*BORDER_SCALE
-    )
-
-    framed = large_framed.resize((TARGET_IMG_SIZE, TARGET_IMG_SIZE), Image.LANCZOS)
-
-    # Paste inner circular image centered, with optional vertical nudge
-    paste_x = (TARGET_IMG_SIZE - inner_diameter) // 2
-    paste_y = (TARGET_IMG_SIZE - inner_diameter) // 2 + VERTICAL_NUDGE
-
-    # Clamp so the photo stays fully inside the ring
-    paste_y = max(0, min(TARGET_IMG_SIZE - inner_diameter, paste_y))
-    framed.paste(inner_sq, (paste_x, paste_y), inner_sq)
-
-    # Compute top-left for placing the framed circle on the banner (centered row)
-    center_x = start_center_x + i * IMAGE_SPACING
-    top_left_x = center_x - TARGET_IMG_SIZE // 2
-    top_left_y = row_center_y - TARGET_IMG_SIZE // 2
-
-    banner.paste(framed, (top_left_x, top_left_y), framed)
-
-# Save output
-banner.save(
-    os.path.join(script_dir, OUTPUT_PATH),
-    dpi=(100, 100)  # sets horizontal and vertical DPI
-)
-print(f"SUPER BANNER is saved to: {OUTPUT_PATH}")
\ No newline at end of file
+def load_fitted(img_path, inner_diameter, cache_dir):
+    return Image.fromarray(np.load(os.path.join(cache_dir, fitted_name(img_path, inner_diameter))))
+
+# === PROCESSING ===
+def make_banner(spec, fitted):
+    # fitted(img_path, inner_diameter) -> RGBA square of the source
+    banner = Image.open(spec["banner"]).convert("RGBA")
+    small_images = spec["images"]
+    diameter, centers = layout_centers(len(small_images), banner.size, spec)
+    inner_diameter = inner_size(diameter, spec)
+    ring = ring_template(diameter, spec["border_width"], spec["border_color"])
+    mask = disk_mask(inner_diameter)
+
+    for img_path, (center_x, center_y) in zip(small_images, centers):
+        # Make it circular via alpha mask
+        inner_sq = fitted(img_path, inner_diameter).copy()
+        inner_sq.putalpha(mask)
+
+        # Framed circle canvas (full target diameter) starts from the ring template
+        framed = ring.copy()
+
+        # Paste inner circular image centered, with optional vertical nudge
+        paste_x = (diameter - inner_diameter) // 2
+        paste_y = (diameter - inner_diameter) // 2 + spec["vertical_nudge"]
+
+        # Clamp so the photo stays fully inside the ring
+        paste_y = max(0, min(diameter - inner_diameter, paste_y))
+        framed.paste(inner_sq, (paste_x, paste_y), inner_sq)
+
+        # top-left for placing the framed circle on the banner
+        top_left_x = center_x - diameter // 2
+        top_left_y = center_y - diameter // 2
+        banner.paste(framed, (top_left_x, top_left_y), framed)
+
+    # Save output
+    banner.save(spec["output"], dpi=(spec["dpi"], spec["dpi"]))  # sets horizontal and vertical DPI
+    return spec["output"]
+
+def render_cached(job):
+    spec, cache_dir = job
+    return make_banner(spec, lambda img_path, inner_diameter: load_fitted(img_path, inner_diameter, cache_dir))
+
+def resolve_spec(raw, base_dir):
+    spec = {**SPEC_DEFAULTS, **raw}
+    resolve = lambda path: path if os.path.isabs(path) else os.path.join(base_dir, path)
+    spec["banner"] = resolve(spec.get("banner", BANNER_PATH))
+    spec["output"] = resolve(spec.get("output", OUTPUT_PATH))
+    # colour name / "#RRGGBB" / [R, G, B] (JSON has no tuples) -> a hashable (R, G, B) for the cached ring
+    color = spec["border_color"]
+    spec["border_color"] = ImageColor.getrgb(color)[:3] if isinstance(color, str) else tuple(int(c) for c in color[:3])
+    images = spec.get("images", SMALL_IMAGES_FOLDER)
+    spec["images"] = list_small_images(resolve(images) if isinstance(images, str) else [resolve(p) for p in images])
+    if not spec["images"]:
+        raise ValueError(f"No small images for {spec['output']}")
+    return spec
+
+def batch_banners(specs, workers=4):
+    # 1) sizes needed per source (layouts only need the banner headers)
+    needed = {}
+    for spec in specs:
+        with Image.open(spec["banner"]) as banner:
+            diameter, _ = layout_centers(len(spec["images"]), banner.size, spec)
+        for img_path in spec["images"]:
+            needed.setdefault(img_path, set()).add(inner_size(diameter, spec))
+
+    cache_dir = tempfile.mkdtemp(prefix="superb_cache_")
+    try:
+        with ProcessPoolExecutor(max_workers=max(1, workers)) as pool:
+            # 2) every source decoded once, fitted at all its sizes
+            list(pool.map(fit_all_sizes, [(p, sorted(sizes), cache_dir) for p, sizes in needed.items()]))
+            # 3) banners composed from the shared cache
+            outputs = list(pool.map(render_cached, [(spec, cache_dir) for spec in specs]))
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    return outputs
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SUPERB - framed round images on a banner")
+    parser.add_argument("--batch", help="JSON list of banner specs")
+    parser.add_argument("--workers", type=int, default=4, help="processes of the batch mode")
+    args = parser.parse_args(argv)
+
+    if args.batch:
+        with open(args.batch, "r", encoding="utf-8") as f:
+            raw_specs = json.load(f)
+        base_dir = os.path.dirname(os.path.abspath(args.batch))
+        specs = [resolve_spec(raw, base_dir) for raw in raw_specs]
+        outputs = batch_banners(specs, args.workers)
+        print(f"{len(outputs)} SUPER BANNERS are saved: {', '.join(outputs)}")
+        return outputs
+
+    # single banner from the configuration, next to this script
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    spec = resolve_spec({}, script_dir)
+    decoded = {}
+
+    def fitted(img_path, inner_diameter):
+        if img_path not in decoded:
+            decoded[img_path] = Image.open(img_path).convert("RGBA")
+        return fit_source(decoded[img_path], inner_diameter)
+
+    make_banner(spec, fitted)
+    print(f"SUPER BANNER is saved to: {OUTPUT_PATH}")
+    return [spec["output"]]
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# This script computes ghost-free composites of any number of input images (e.g. md snapshots):
+# per-pixel median, trimmed mean and percentiles of the whole stack.
+# The decoded stack is spilled to a memory-mapped uint8 cube on disk, then reduced band by band
+# (a few rows of all images at once) on worker threads, so thousands of 4K snapshots
+# can be reduced with modest RAM.
+# (c) The Visual Hub, 2025
+#
+# Usage: python medianSNAP.py [folder] --stat median --stat p90 --stat trimmed10 [-o ./stack]
+
+import os
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+import numpy as np
+from Advanced_averageSNAP import list_snapshots, iter_decoded, decode_workers, folder_path
+
+# Output prefix: one image per statistic, e.g. ./stack_median.png
+output_prefix = "./stack"
+statistics = ["median"] # "median", "trimmedXX" (XX % cut on each side) or "pXX" (percentile)
+reduce_workers = 4 # bands reduced in parallel
+band_mb = 256 # memory budget of one band (per worker)
+
+def spill_stack(paths, cube_path, workers=decode_workers):
+    # decoded images are written one after another into a (n_images, height, width, 4) uint8 memmap
+    cube = None
+    for i, (img_path, arr) in enumerate(iter_decoded(paths, workers)):
+        if cube is None:
+            cube = np.lib.format.open_memmap(cube_path, mode="w+", dtype=np.uint8, shape=(len(paths),) + arr.shape)
+        elif arr.shape != cube.shape[1:]:
+            raise ValueError(f"{img_path} has size {arr.shape[1]}x{arr.shape[0]}, "
+                             f"expected {cube.shape[2]}x{cube.shape[1]}")
+        cube[i] = arr
+    cube.flush()
+    return cube
+
+def reduce_band(band, stat):
+    # band: (n_images, rows, width, channels) uint8 -> (rows, width, channels) uint8
+    if stat == "median":
+        out = np.median(band, axis=0)
+    elif stat.startswith("p"):
+        out = np.percentile(band, float(stat[1:]), axis=0)
+    elif stat.startswith("trimmed"):
+        n = band.shape[0]
+        cut = int(n * float(stat[len("trimmed"):]) / 100)
+        if 2 * cut >= n:
+            raise ValueError(f"{stat} cuts all {n} images")
+        ordered = np.sort(band, axis=0)
+        out = ordered[cut:n - cut].mean(axis=0, dtype=np.float32)
+    else:
+        raise ValueError(f"Unknown statistic: {stat}")
+    return np.clip(np.rint(out), 0, 255).astype(np.uint8)
+
+def reduce_stack(cube, stats, workers=reduce_workers, band_mb=band_mb):
+    n, height, width, channels = cube.shape
+    rows = max(1, int(band_mb * 2**20 // (n * width * channels)))
+    outputs = {stat: np.empty((height, width, channels), dtype=np.uint8) for stat in stats}
+
+    def reduce_rows(y0):
+        band = np.asarray(cube[:, y0:y0 + rows]) # one read of the band for all statistics
+        for stat in stats:
+            outputs[stat][y0:y0 + rows] = reduce_band(band, stat)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        list(pool.map(reduce_rows, range(0, height, rows)))
+    return outputs
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Median / trimmed mean / percentile composites of MD snapshots")
+    parser.add_argument("folder", nargs="?", default=folder_path)
+    parser.add_argument("-o", "--output-prefix", default=output_prefix)
+    parser.add_argument("--stat", action="append", help="median, trimmedXX or pXX (repeatable)")
+    parser.add_argument("--workers", type=int, default=reduce_workers, help="reduction threads")
+    parser.add_argument("--band-mb", type=float, default=band_mb, help="memory budget of one band")
+    parser.add_argument("--cube", help="path of the memory-mapped stack (default: temporary file)")
+    parser.add_argument("--keep-cube", action="store_true", help="do not delete the stack file")
+    args = parser.parse_args(argv)
+    stats = args.stat or statistics
+
+    paths = list_snapshots(args.folder)
+    print(f"Detected {len(paths)} images. Spilling the stack to disk ..")
+    cube_path = args.cube
+    if cube_path is None:
+        fd, cube_path = tempfile.mkstemp(suffix=".npy", prefix="snapshot_stack_")
+        os.close(fd)
+    try:
+        cube = spill_stack(paths, cube_path)
+        print(f"Reducing {cube.shape[0]} x {cube.shape[2]}x{cube.shape[1]} stack: {', '.join(stats)}")
+        outputs = reduce_stack(cube, stats, args.workers, args.band_mb)
+        del cube
+    finally:
+        if not args.keep_cube and os.path.exists(cube_path):
+            os.remove(cube_path)
+
+    saved = []
+    for stat, arr in outputs.items():
+        path = f"{args.output_prefix}_{stat}.png"
+        Image.fromarray(arr).save(path)
+        saved.append(path)
+        print(f"{stat} saved to {path}")
+    return saved
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,173 @@
 # combine images from input folder into the grid
 # supports resize and border colors
+# streaming: cell size comes from the image headers, tiles are decoded on a thread pool
+# (JPEGs in draft mode, close to the thumbnail size) and pasted as soon as they are ready
+# thumbnail cache: resized images are kept on disk (keyed by file + thumb_size + filter, LRU size cap),
+# so trying other layouts / borders over the same folder skips decoding altogether
+# tiled output: grids larger than memory are written as a DeepZoom (.dzi) tile pyramid,
+# one row of cells at a time, lower levels built by streaming 2x2 downsampling
 # (c) VisualHub 2025
 #
 import os
+import math
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
 from PIL import Image, ImageOps
 
+def header_size(img_path):
+    # only the header is read, no pixels are decoded
+    with Image.open(img_path) as img:
+        return img.size
+
+def decode_thumbnail(img_path, thumb_size, resample=Image.BICUBIC):
+    with Image.open(img_path) as img:
+        # JPEG: decode directly at 1/2, 1/4 or 1/8 scale, still at least thumb_size
+        img.draft("RGB", thumb_size)
+        img = img.convert("RGB")
+    return img.resize(thumb_size, resample, reducing_gap=3.0)
+
+def thumbnail_key(img_path, thumb_size, resample):
+    # a modified source (size or mtime) gets a new key, its old thumbnail ages out of the cache
+    st = os.stat(img_path)
+    key = f"{os.path.abspath(img_path)}|{st.st_size}|{st.st_mtime_ns}|{thumb_size[0]}x{thumb_size[1]}|{int(resample)}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+def cached_thumbnail(img_path, thumb_size, resample, cache_dir):
+    cache_path = os.path.join(cache_dir, thumbnail_key(img_path, thumb_size, resample) + ".png")
+    try:
+        with Image.open(cache_path) as img:
+            img.load()
+        os.utime(cache_path)  # last use, for the LRU eviction
+        return img
+    except OSError:  # missing or unreadable
+        pass
+    img = decode_thumbnail(img_path, thumb_size, resample)
+    # written aside then renamed, parallel builds never read a half-written thumbnail
+    tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    img.save(tmp_path, format="PNG", compress_level=1)
+    os.replace(tmp_path, cache_path)
+    return img
+
+def evict_thumbnails(cache_dir, cache_mb):
+    # least recently used thumbnails go first, until the cache fits in cache_mb
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.is_file() and entry.name.endswith(".png"):
+            st = entry.stat()
+            entries.append((st.st_mtime, st.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= cache_mb * 2**20:
+            break
+        os.remove(path)
+        total -= size
+        removed += 1
+    return removed
+
+def load_tile(img_path, resize, thumb_size, border_size, border_color, resample=Image.BICUBIC, cache_dir=None):
+    if resize and cache_dir:
+        img = cached_thumbnail(img_path, thumb_size, resample, cache_dir)
+    elif resize:
+        img = decode_thumbnail(img_path, thumb_size, resample)
+    else:
+        with Image.open(img_path) as img:
+            img = img.convert("RGB")
+
+    # ALWAYS add border (resized or not)
+    if border_size > 0:
+        img = ImageOps.expand(img, border=border_size, fill=border_color)
+    return img
+
+def halve(rows):
+    # 2x2 box filter of an even number of rows; an odd last column is repeated (DeepZoom sizes round up)
+    if rows.shape[1] % 2:
+        rows = np.concatenate([rows, rows[:, -1:]], axis=1)
+    r = rows.astype(np.uint16)
+    return ((r[0::2, 0::2] + r[1::2, 0::2] + r[0::2, 1::2] + r[1::2, 1::2] + 2) >> 2).astype(np.uint8)
+
+class DeepZoomWriter:
+    # DeepZoom pyramid fed with horizontal bands of the full-resolution image, top to bottom:
+    # every level keeps less than one row of tiles plus an odd row waiting for its pair
+    def __init__(self, output_path, width, height, tile_size=256, tile_format="jpg", quality=90, pool=None):
+        base = os.path.splitext(output_path)[0]
+        self.dzi_path = base + ".dzi"
+        self.tiles_dir = base + "_files"
+        self.width, self.height = width, height
+        self.tile_size = tile_size
+        self.tile_format = tile_format
+        self.quality = quality
+        self.pool = pool
+        self.saving = []
+        self.max_level = max(0, math.ceil(math.log2(max(width, height))))
+        self.levels = {}
+        for level in range(self.max_level, -1, -1):
+            os.makedirs(os.path.join(self.tiles_dir, str(level)), exist_ok=True)
+            self.levels[level] = {"buffer": None, "carry": None, "row": 0}
+
+    def save_tile(self, tile, path):
+        img = Image.fromarray(tile)
+        if self.tile_format == "png":
+            img.save(path, compress_level=3)
+        else:
+            img.save(path, quality=self.quality)
+
+    def write_tiles(self, level, rows):
+        state = self.levels[level]
+        for x in range(0, rows.shape[1], self.tile_size):
+            path = os.path.join(self.tiles_dir, str(level), f"{x // self.tile_size}_{state['row']}.{self.tile_format}")
+            tile = np.ascontiguousarray(rows[:, x:x + self.tile_size])
+            if self.pool is not None:
+                self.saving.append(self.pool.submit(self.save_tile, tile, path))
+            else:
+                self.save_tile(tile, path)
+        state["row"] += 1
+
+    def push(self, rows, level=None):
+        level = self.max_level if level is None else level
+        state = self.levels[level]
+        # full rows of tiles are written right away
+        buffer = rows if state["buffer"] is None else np.concatenate([state["buffer"], rows])
+        while len(buffer) >= self.tile_size:
+            self.write_tiles(level, buffer[:self.tile_size])
+            buffer = buffer[self.tile_size:]
+        state["buffer"] = buffer if len(buffer) else None
+        # pairs of rows go down one level
+        if level > 0:
+            pairs = rows if state["carry"] is None else np.concatenate([state["carry"], rows])
+            even = len(pairs) // 2 * 2
+            state["carry"] = pairs[even:] if even < len(pairs) else None
+            if even:
+                self.push(halve(pairs[:even]), level - 1)
+        if level == self.max_level:
+            self.wait_saving()
+
+    def wait_saving(self):
+        for future in self.saving:
+            future.result()
+        self.saving = []
+
+    def finish(self):
+        for level in range(self.max_level, -1, -1):
+            state = self.levels[level]
+            if state["buffer"] is not None:
+                self.write_tiles(level, state["buffer"])  # the last, partial row of tiles
+                state["buffer"] = None
+            if level > 0 and state["carry"] is not None:
+                # odd height: the last row is paired with itself
+                self.push(halve(np.concatenate([state["carry"], state["carry"]])), level - 1)
+                state["carry"] = None
+        self.wait_saving()
+        with open(self.dzi_path, "w", encoding="utf-8") as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                    f'<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" TileSize="{self.tile_size}" '
+                    f'Overlap="0" Format="{self.tile_format}">\n'
+                    f'  <Size Width="{self.width}" Height="{self.height}"/>\n'
+                    '</Image>\n')
+        return self.dzi_path
+
 def create_super_grid(
     input_folder,
     output_path,
@@ -13,7 +176,15 @@ def create_super_grid(
     resize=True,  # if activated will resize all images according to ..
     thumb_size=(200, 200),  # .. these dimensions ;-D
     border_size=5,
-    border_color="black"
+    border_color="black",
+    workers=4,  # decoding threads
+    prefetch=16,  # max decoded tiles waiting to be pasted
+    resample=Image.BICUBIC,
+    cache_dir=None,  # thumbnail cache folder (used with resize), None -> no cache
+    cache_mb=512,  # size cap of the thumbnail cache
+    tiled=False,  # True -> DeepZoom pyramid (output_path.dzi + output_path_files/) instead of one image
+    tile_size=256,
+    tile_format="jpg"
 ):
 
     supported_ext = (".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp")
@@ -21,54 +192,86 @@ def create_super_grid(
         os.path.join(input_folder, f)
         for f in os.listdir(input_folder)
         if f.lower().endswith(supported_ext)
-    ]
+    ][:N * K]
 
     if len(image_files) == 0:
         raise ValueError("Bad news! Ain't no images in the input folder.")
 
-    images = []
-    widths = []
-    heights = []
+    # cell size based on largest image (with border), from the headers only
+    if resize:
+        cell_w, cell_h = thumb_size
+    else:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            sizes = list(pool.map(header_size, image_files))
+        cell_w = max(w for w, h in sizes)
+        cell_h = max(h for w, h in sizes)
+    cell_w += 2 * border_size
+    cell_h += 2 * border_size
 
-    # load and optionally resize
-    for img_path in image_files[:N * K]:
-        img = Image.open(img_path).convert("RGB")
+    grid_w = K * cell_w
+    grid_h = N * cell_h
 
-        if resize:
-            img = img.resize(thumb_size)
+    if resize and cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
 
-        # ALWAYS add border (resized or not)
-        if border_size > 0:
-            img = ImageOps.expand(img, border=border_size, fill=border_color)
+    # tiled: one band (row of cells) per grid row, handed to the pyramid once all its cells are in
+    bands = {}
+    filled = [0] * N
+    expected = [max(0, min(K, len(image_files) - row * K)) for row in range(N)]
+    next_band = 0
+    writer = None
+    grid = None if tiled else Image.new("RGB", (grid_w, grid_h), "white")
 
-        images.append(img)
-        widths.append(img.width)
-        heights.append(img.height)
+    def flush_bands(last=False):
+        nonlocal next_band
+        while next_band < N and (last or filled[next_band] == expected[next_band]):
+            band = bands.pop(next_band, None) or Image.new("RGB", (grid_w, cell_h), "white")
+            writer.push(np.asarray(band))
+            next_band += 1
 
-    # cell size based on largest image (with border)
-    cell_w = max(widths)
-    cell_h = max(heights)
+    def paste(index, img):
+        row, col = divmod(index, K)
+        # center image inside cell
+        offset_x = col * cell_w + (cell_w - img.width) // 2
+        offset_y = (cell_h - img.height) // 2
+        if tiled:
+            if row not in bands:
+                bands[row] = Image.new("RGB", (grid_w, cell_h), "white")
+            bands[row].paste(img, (offset_x, offset_y))
+            filled[row] += 1
+            flush_bands()
+        else:
+            grid.paste(img, (offset_x, row * cell_h + offset_y))
 
-    grid_w = K * cell_w
-    grid_h = N * cell_h
-    
-    grid = Image.new("RGB", (grid_w, grid_h), "white")
-
-    index = 0
-    for row in range(N):
-        for col in range(K):
-            if index < len(images):
-                
-                img = images[index]
-                
-                # center image inside cell
-                offset_x = col * cell_w + (cell_w - img.width) // 2
-                offset_y = row * cell_h + (cell_h - img.height) // 2
-
-                grid.paste(img, (offset_x, offset_y))
-                index += 1
-
-    grid.save(output_path)
+    # decode on the pool, paste in completion order, at most `prefetch` tiles alive at once
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        if tiled:
+            writer = DeepZoomWriter(output_path, grid_w, grid_h, tile_size, tile_format, pool=pool)
+        pending = {}
+
+        def paste_ready():
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                paste(pending.pop(future), future.result())  # the tile is released right after
+
+        for index, img_path in enumerate(image_files):
+            future = pool.submit(load_tile, img_path, resize, thumb_size, border_size, border_color,
+                                 resample, cache_dir)
+            pending[future] = index
+            if len(pending) >= max(1, prefetch):
+                paste_ready()
+        while pending:
+            paste_ready()
+
+        if tiled:
+            flush_bands(last=True)
+            output_path = writer.finish()
+
+    if resize and cache_dir:
+        evict_thumbnails(cache_dir, cache_mb)
+
+    if not tiled:
+        grid.save(output_path)
     print(f"Work completed! Grid image saved to {output_path}")
 
 
@@ -82,5 +285,7 @@ if __name__ == "__main__":
         resize=False, # False -> keep original size
         thumb_size=(500, 500),
         border_size=5,
-        border_color="goldenrod"   # can be color name or (R,G,B)
+        border_color="goldenrod",  # can be color name or (R,G,B)
+        cache_dir="thumb_cache",   # reused thumbnails when resize=True
+        tiled=False                # True -> output_grid.dzi tile pyramid (grids larger than memory)
     )
@@ -10,14 +10,41 @@
 # Current version implements three different strategies
 # This script is developed exclusively for non-commercial educational purposes.  
 # The Visual Hub. © 2025 - All Rights Reserved.
+import os
+import sys
 import numpy as np
 from chimerax.core.commands import run
 
+# the headless numerics (morph_tools.py) live next to this script
+try:
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+except NameError:
+    script_dir = os.getcwd()
+if script_dir not in sys.path:
+    sys.path.insert(0, script_dir)
+from morph_tools import residue_index, pack_residues, common_residues, rmsd_matrix, assign_chains
+from morph_tools import pair_atoms, interpolate_coordsets, prepare_pairs, chain_morph_trajectory
+from morph_tools import save_trajectory, MorphTrajectory
+
 # Basic options: PDB ids of structures which will be morphed
 pdb1 = "1exr" # reference - open structure of calmodulin
 pdb2 = "1qs7" # target - closed structure of calmodulin
 # Set morphing trajectory duration:
 morphing_frames = "250" # 250 frames = 10 sec for a movie recorded at 25 fps (for PAL region)
+# Morphing engine: "chimerax" (the built-in morph command) or "numpy" (morph_tools.py, frames added as coordsets)
+morph_engine = "chimerax"
+# Interpolation of the numpy engine: "linear", "eased" or "rigid" (SLERP of the superposition + residual motion)
+morph_mode = "linear"
+# Chain morph: an ordered list of states (A -> B -> C ...) morphed into one continuous trajectory
+# with the numpy engine (morphing_frames per step); leave it empty for the classic pdb1 -> pdb2 morph
+pdb_states = [] # e.g. ["1exr", "1cll", "1qs7"]
+prep_cache_dir = "morph_cache" # pairwise preparations are cached here (keyed by structure content + strategy)
+prep_workers = 4 # pairwise preparations computed in parallel
+# Export of the finished morph to a compact folder (topology.pdb + .npy frames), e.g. "calmodulin.morph"
+export_morph_path = "" # empty = no export
+export_codec = "delta" # "delta" (float32 keyframes + int16 deltas) or "float16"
+# Reload a previously exported morph instead of preparing and morphing again (empty = off)
+reload_morph_path = ""
 
 ##### ADVANCED OPTIONS ###########
 #
@@ -30,6 +57,8 @@ morphing_frames = "250" # 250 frames = 10 sec for a movie recorded at 25 fps (fo
 strategy_mode = "chain" # select beetween "rmsd" or "chain", or "none"
 # (fitting cut-off for the rmsd strategy)
 rmsd_cutoff = 5
+# superimpose every chain pair before scoring (otherwise RMSD is taken after the global matchmaker fit)
+rmsd_superpose = False
 
 # Creative triggers to apply style visualization and camera focusing
 apply_style = True
@@ -85,6 +114,9 @@ def prepare_structure(session):
         session: ChimeraX session object.
         use_rmsd_strategy (bool): If True, use RMSD-based pruning; else use chain ID comparison.
         rmsd_cutoff (float): RMSD cutoff used when use_rmsd_strategy is True.
+
+    Returns:
+        dict or None: chain correspondence of the rmsd strategy (target chain ID -> reference chain ID).
     """
     # in this case pre-processing is skipped (it's very good option if your structures are identical)
     if strategy_mode == "none":
@@ -92,20 +124,27 @@ def prepare_structure(session):
         return
 
     if strategy_mode == "rmsd":
-        match_and_prune(session, ref_model_id=1, target_model_id=2, rmsd_cutoff=rmsd_cutoff)
+        return match_and_prune(session, ref_model_id=1, target_model_id=2, rmsd_cutoff=rmsd_cutoff)
     elif strategy_mode == "chain":
         delete_unmatched_chains(session)
     else:
         raise ValueError(f"Unknown strategy mode: {strategy_mode}")
 
 # The first strategy: RMSD-based filtering
-def calculate_rmsd(atoms1, atoms2):
-    coords1 = np.array([a.coord for a in atoms1])
-    coords2 = np.array([a.coord for a in atoms2])
-    diff = coords1 - coords2
-    return np.sqrt(np.mean(np.sum(diff * diff, axis=1)))
-
-def match_and_prune(session, ref_model_id, target_model_id, rmsd_cutoff=5.0):
+def chain_indices(model):
+    # residue-number index of every chain, built once from its CA atoms
+    # (scene coordinates include the matchmaker fit)
+    chains = list(model.chains)
+    indices = []
+    for chain in chains:
+        atoms = chain.existing_residues.atoms
+        ca = atoms.filter(atoms.names == 'CA')
+        indices.append(residue_index(ca.residues.numbers, ca.scene_coords))
+    return chains, indices
+
+def match_and_prune(session, ref_model_id, target_model_id, rmsd_cutoff=5.0, superpose=None):
+    if superpose is None:
+        superpose = rmsd_superpose
     run(session, f'matchmaker #{target_model_id} to #{ref_model_id}')
     ref_model = next((m for m in session.models if m.id[0] == ref_model_id), None)
     target_model = next((m for m in session.models if m.id[0] == target_model_id), None)
@@ -114,31 +153,35 @@ def match_and_prune(session, ref_model_id, target_model_id, rmsd_cutoff=5.0):
         session.logger.error("Reference or target model not found.")
         return
 
-    matched_chain_ids = set()
-
-    for t_chain in target_model.chains:
-        best_rmsd = None
-
-        for r_chain in ref_model.chains:
-            t_ca = [a for a in t_chain.existing_residues.atoms if a.name == 'CA']
-            r_ca = [a for a in r_chain.existing_residues.atoms if a.name == 'CA']
-
-            min_len = min(len(t_ca), len(r_ca))
-            if min_len >= 3:
-                try:
-                    rmsd_val = calculate_rmsd(t_ca[:min_len], r_ca[:min_len])
-                    if best_rmsd is None or rmsd_val < best_rmsd:
-                        best_rmsd = rmsd_val
-                except Exception:
-                    continue
+    ref_chains, ref_indices = chain_indices(ref_model)
+    target_chains, target_indices = chain_indices(target_model)
+
+    # all chain pairs are scored at once: CA atoms are paired by residue number, so gaps
+    # and different termini only reduce the number of compared residues
+    xyz, mask, _ = pack_residues(ref_indices + target_indices)
+    n_ref = len(ref_indices)
+    rmsd = rmsd_matrix(xyz[:n_ref], mask[:n_ref], xyz[n_ref:], mask[n_ref:], superpose=superpose)
+    assigned = assign_chains(rmsd)
+
+    # target chain ID -> reference chain ID: target chains take these IDs when morph atoms are paired
+    correspondence = {}
+    unmatched = []
+    for t_index, t_chain in enumerate(target_chains):
+        r_index = assigned[t_index]
+        if r_index >= 0 and rmsd[t_index, r_index] <= rmsd_cutoff:
+            numbers, _, _ = common_residues(ref_indices[r_index], target_indices[t_index])
+            correspondence[t_chain.chain_id] = ref_chains[r_index].chain_id
+            session.logger.info(f"Chain {t_chain.chain_id} matched to {ref_chains[r_index].chain_id} "
+                                f"(RMSD {rmsd[t_index, r_index]:.2f} over {len(numbers)} residues)")
+        else:
+            unmatched.append(t_chain.chain_id)
 
-        if best_rmsd is not None and best_rmsd <= rmsd_cutoff:
-            matched_chain_ids.add(t_chain.chain_id)
+    # a single delete command for all unmatched chains
+    if unmatched:
+        run(session, f'delete #{target_model_id}/{",".join(unmatched)}')
+        session.logger.info(f"Deleted unmatched chains {', '.join(unmatched)} (RMSD > {rmsd_cutoff})")
 
-    for t_chain in target_model.chains:
-        if t_chain.chain_id not in matched_chain_ids:
-            run(session, f'delete #{target_model_id}/{t_chain.chain_id}')
-            session.logger.info(f"Deleted unmatched chain {t_chain.chain_id} (RMSD > {rmsd_cutoff})")
+    return correspondence
 
 # The second (trivial) strategy: chain-comparison based filtering (works with simple structures)
 def delete_unmatched_chains(session):
@@ -160,7 +203,63 @@ def delete_unmatched_chains(session):
     else:
         session.logger.info("No unmatched chains found.")
 
-def craft_morph(session, ref_model_id=1, target_model_id=2, frames=morphing_frames):
+# The NumPy morphing engine: atoms are paired by chain, residue number and atom name
+def morph_atom_keys(model, chain_map=None):
+    atoms = model.atoms
+    residues = atoms.residues
+    chain_ids = residues.chain_ids
+    if chain_map:
+        # target chains take the IDs of the reference chains they were matched to
+        unique_ids, inverse = np.unique(chain_ids, return_inverse=True)
+        chain_ids = np.array([chain_map.get(c, c) for c in unique_ids])[inverse]
+    return atoms, (chain_ids, residues.numbers, atoms.names)
+
+def craft_numpy_morph(session, ref_model, target_model, frames, correspondence=None, mode=None):
+    """
+    Builds the morph trajectory with morph_tools.interpolate_coordsets and adds it as coordsets
+    of a copy of the reference model.
+
+    Parameters:
+        session: ChimeraX session object.
+        ref_model, target_model: the two prepared structures.
+        frames (int): Number of frames for the morph trajectory.
+        correspondence (dict): chain correspondence returned by match_and_prune (optional).
+        mode (str): interpolation mode, defaults to the global morph_mode.
+
+    Returns:
+        the morph model
+    """
+    ref_atoms, ref_keys = morph_atom_keys(ref_model)
+    target_atoms, target_keys = morph_atom_keys(target_model, correspondence)
+    ref_positions, target_positions = pair_atoms(ref_keys, target_keys)
+    if len(ref_positions) == 0:
+        raise ValueError(f"No atoms could be paired between #{ref_model.id_string} and #{target_model.id_string}")
+
+    # both end states in the coordinate system of the reference model
+    ref_xyz = ref_atoms.coords[ref_positions]
+    target_xyz = ref_model.scene_position.inverse().transform_points(target_atoms.scene_coords[target_positions])
+    coordsets = interpolate_coordsets(ref_xyz, target_xyz, frames, mode=mode or morph_mode)
+
+    morph = add_morph_model(session, ref_model, ref_positions, coordsets,
+                            f"morph {ref_model.name} to {target_model.name}", [ref_model, target_model])
+    session.logger.info(f"{len(ref_positions)} paired atoms morphed in {len(coordsets)} frames ({mode or morph_mode}).")
+    return morph
+
+def add_morph_model(session, template, positions, coordsets, name, hidden_models):
+    # copy of the template model reduced to the morphed atoms, with one coordset per frame
+    morph = template.copy(name)
+    unpaired = np.ones(template.num_atoms, dtype=bool)
+    unpaired[positions] = False
+    if unpaired.any():
+        morph.atoms.filter(unpaired).delete()
+    morph.add_coordsets(coordsets, replace=True)
+    session.models.add([morph])
+    run(session, f'hide {" ".join(f"#{m.id_string}" for m in hidden_models)} models')
+    if session.ui.is_gui: # the slider is a GUI tool (headless batch workers skip it)
+        run(session, f'coordset slider #{morph.id_string}')
+    return morph
+
+def craft_morph(session, ref_model_id=1, target_model_id=2, frames=morphing_frames, correspondence=None):
     """
     Performs morphing between reference and target structures.
 
@@ -169,45 +268,119 @@ def craft_morph(session, ref_model_id=1, target_model_id=2, frames=morphing_fram
         ref_model_id (int): ID of the reference model.
         target_model_id (int): ID of the target model.
         frames (int): Number of frames for the morph trajectory.
+        correspondence (dict): chain correspondence of the rmsd strategy (numpy engine only).
     """
     try:
-        run(session, f'morph #{ref_model_id},{target_model_id} frames {frames}')
-        session.logger.info(f"#{ref_model_id} is being morphed into #{target_model_id} in {frames} frames.")
-
-
-        if apply_style:
-            run(session, f'preset {preset}')
-            run(session, f'color protein {cartoon_color} target c')
-            run(session, f'show ions target a')
-            run(session, f'style ions sphere')
-            run(session, f'size ions atomRadius default')
-            run(session, f'size ions atomRadius -0.5')
-            run(session, f'color ions {cofactor_color} target a')
-            run(session, f'set bgcolor {bg_color}')
+        if morph_engine == "numpy":
+            ref_model = next((m for m in session.models if m.id == (ref_model_id,)), None)
+            target_model = next((m for m in session.models if m.id == (target_model_id,)), None)
+            craft_numpy_morph(session, ref_model, target_model, frames, correspondence)
+        elif morph_engine == "chimerax":
+            run(session, f'morph #{ref_model_id},{target_model_id} frames {frames}')
         else:
-            session.logger.info(f"No style applied")
+            raise ValueError(f"Unknown morph engine: {morph_engine}")
+        session.logger.info(f"#{ref_model_id} is being morphed into #{target_model_id} in {frames} frames.")
+        style_morph(session)
     except Exception as e:
         session.logger.error(f"Ain't no morphing today. Sorry! {e}")
 
+def style_morph(session):
+    if apply_style:
+        run(session, f'preset {preset}')
+        run(session, f'color protein {cartoon_color} target c')
+        run(session, f'show ions target a')
+        run(session, f'style ions sphere')
+        run(session, f'size ions atomRadius default')
+        run(session, f'size ions atomRadius -0.5')
+        run(session, f'color ions {cofactor_color} target a')
+        run(session, f'set bgcolor {bg_color}')
+    else:
+        session.logger.info(f"No style applied")
+
 
 def get_all_models(model):
     yield model
     for child in model.child_models():
         yield from get_all_models(child)
 
-def view_morph_model(session):
+def find_morph_model(session):
     for top_model in session.models.list():
         for model in get_all_models(top_model):
             name = model.name or ""
             if "morph" in name.lower():
-                session.logger.info(f"This is your morphing model: {name}, ID: #{model.id_string}")
-                run(session, f"view #{model.id_string}")
-                ##run(session, f"zoom 0.8") # activate if you need shift camera on the back plane
-                #model.selected = True # activate if you need to select morphing model
-                return
+                return model
+    return None
+
+def view_morph_model(session):
+    model = find_morph_model(session)
+    if model is not None:
+        session.logger.info(f"This is your morphing model: {model.name}, ID: #{model.id_string}")
+        run(session, f"view #{model.id_string}")
+        ##run(session, f"zoom 0.8") # activate if you need shift camera on the back plane
+        #model.selected = True # activate if you need to select morphing model
+        return
 
-    if not found:
-        session.logger.info("We have a small problem: no morphing model found...")
+    session.logger.info("We have a small problem: no morphing model found...")
+
+# Compact export and fast reload of the morph trajectory
+def export_morph(session, path, codec=None):
+    """
+    Saves the morph model as topology.pdb (current frame) + all frames with morph_tools.save_trajectory.
+
+    Parameters:
+        session: ChimeraX session object.
+        path (str): output folder.
+        codec (str): "delta" or "float16", defaults to the global export_codec.
+    """
+    morph = find_morph_model(session)
+    if morph is None:
+        session.logger.error("No morphing model to export.")
+        return
+    os.makedirs(path, exist_ok=True)
+    run(session, f'save "{os.path.join(path, "topology.pdb")}" models #{morph.id_string}')
+
+    active = morph.active_coordset_id
+    coordsets = []
+    for cs_id in morph.coordset_ids:
+        morph.active_coordset_id = cs_id
+        coordsets.append(morph.atoms.coords)
+    morph.active_coordset_id = active
+
+    _, keys = morph_atom_keys(morph)
+    meta = save_trajectory(path, np.array(coordsets), keys=keys, codec=codec or export_codec)
+    session.logger.info(f"Morph #{morph.id_string} exported to {path} ({meta['frames']} frames, {meta['codec']}).")
+
+def load_morph(session, path):
+    """
+    Opens an exported morph: topology.pdb gets the memory-mapped frames as coordsets.
+
+    Parameters:
+        session: ChimeraX session object.
+        path (str): folder written by export_morph.
+
+    Returns:
+        the morph model
+    """
+    trajectory = MorphTrajectory(path)
+    before = set(session.models.list())
+    run(session, f'open "{os.path.join(path, "topology.pdb")}"')
+    model = next(m for m in session.models.list() if m not in before and len(m.id) == 1)
+    model.name = f"morph {os.path.basename(os.path.normpath(path))}"
+
+    # PDB round trips may reorder atoms: pair them with the stored keys
+    atoms, keys = morph_atom_keys(model)
+    stored = trajectory.keys
+    model_positions, frame_positions = pair_atoms(keys, (stored["chain"], stored["number"], stored["name"]))
+    coordsets = trajectory.coordsets()[:, frame_positions]
+    unpaired = np.ones(len(atoms), dtype=bool)
+    unpaired[model_positions] = False
+    if unpaired.any():
+        model.atoms.filter(unpaired).delete()
+    model.add_coordsets(np.ascontiguousarray(coordsets), replace=True)
+    if session.ui.is_gui:
+        run(session, f'coordset slider #{model.id_string}')
+    session.logger.info(f"Morph reloaded from {path}: {len(trajectory)} frames, {len(model_positions)} atoms.")
+    return model
 
 ### Let's start your morphing journey ! ###
 def MasterOfMorphing(session, pdb1, pdb2):
@@ -222,12 +395,67 @@ def MasterOfMorphing(session, pdb1, pdb2):
         rmsd_cutoff: float - cutoff (if the RMSD strategy is selected)
     """
     load_models(session, pdb1, pdb2)
-    prepare_structure(session)
-    craft_morph(session, ref_model_id=1, target_model_id=2)
+    correspondence = prepare_structure(session)
+    craft_morph(session, ref_model_id=1, target_model_id=2, correspondence=correspondence)
+    if export_morph_path:
+        export_morph(session, export_morph_path)
+    get_boolean_status(session)
+    if orient_camera_on_morph:
+        view_morph_model(session)
+
+### Morph through a whole chain of states ! ###
+def ChainOfMorphing(session, states):
+    """
+    Morph an ordered list of structures (A -> B -> C ...) into one continuous trajectory.
+    The pairwise preparations (chain matching + superposition, see strategy_mode) run in parallel
+    and are cached in prep_cache_dir, so re-rendering with new frames or style skips them.
+    Parameters:
+        session: ChimeraX session object
+        states: list - paths or PDB IDs of the states, in morphing order
+    """
+    if len(states) < 2:
+        raise ValueError("A chain morph needs at least 2 states")
+    models = []
+    for i, state in enumerate(states):
+        run(session, f'open {state}')
+        models.append(next((m for m in session.models if m.id == (i + 1,)), None))
+
+    # residue indices of the chains (for the preparation), keys and coordinates of all atoms (for the trajectory)
+    chain_states, atom_states = [], []
+    for model in models:
+        chains, indices = chain_indices(model)
+        chain_states.append([(chain.chain_id, index) for chain, index in zip(chains, indices)])
+        atoms, keys = morph_atom_keys(model)
+        atom_states.append((keys, atoms.scene_coords))
+
+    preparations, n_cached = prepare_pairs(chain_states, strategy_mode, rmsd_cutoff,
+                                           cache_dir=os.path.join(script_dir, prep_cache_dir), workers=prep_workers)
+    session.logger.info(f"{n_cached} of {len(preparations)} pairwise preparations loaded from the cache.")
+
+    positions, coordsets = chain_morph_trajectory(atom_states, preparations, int(morphing_frames), mode=morph_mode)
+    # the trajectory is in scene coordinates, coordsets are in model coordinates of the first state
+    to_model = models[0].scene_position.inverse()
+    coordsets = to_model.transform_points(coordsets.reshape(-1, 3)).reshape(coordsets.shape)
+    add_morph_model(session, models[0], positions, coordsets, f"morph chain of {len(models)} states", models)
+    session.logger.info(f"{len(positions)} shared atoms morphed through {len(models)} states in {len(coordsets)} frames.")
+
+    style_morph(session)
+    if export_morph_path:
+        export_morph(session, export_morph_path)
     get_boolean_status(session)
     if orient_camera_on_morph:
         view_morph_model(session)
 
 # Execute the main function (using the parameters defined outside):
-MasterOfMorphing(session, pdb1, pdb2)
+# ChimeraX provides session when the script is opened; importing the module (e.g. morph_worker.py) runs nothing
+if "session" in globals():
+    if reload_morph_path:
+        load_morph(session, reload_morph_path)
+        style_morph(session)
+        if orient_camera_on_morph:
+            view_morph_model(session)
+    elif pdb_states:
+        ChainOfMorphing(session, pdb_states)
+    else:
+        MasterOfMorphing(session, pdb1, pdb2)
 #MasterOfMorphing(session, pdb1, pdb2, use_rmsd_strategy=True) # example with internal control only (ignoring the external variables)
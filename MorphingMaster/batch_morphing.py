@@ -0,0 +1,202 @@
+# Batch morphing - headless morphs for a whole manifest of structure pairs
+# Runs outside of ChimeraX (plain Python): a pool of headless ChimeraX workers (morph_worker.py)
+# is started once, every worker reuses its session between jobs.
+#
+# Manifest: one JSON job per line, e.g.
+#   {"id": "calmodulin", "pdb1": "1exr", "pdb2": "1qs7", "strategy": "rmsd", "rmsd_cutoff": 5, "frames": 250}
+#   {"id": "cycle", "states": ["1exr", "1cll", "1qs7"], "frames": 100, "mode": "eased"}
+# Optional job keys: engine, mode, apply_style, export_codec, movie (true or a path), export (true or a path)
+#
+# Usage: python batch_morphing.py manifest.jsonl --workers 4 --chimerax /path/to/ChimeraX
+# Any executable speaking the worker protocol can replace ChimeraX (e.g. a stub for tests).
+# This script is developed exclusively for non-commercial educational purposes.
+# The Visual Hub. © 2025 - All Rights Reserved.
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+import subprocess
+from collections import deque
+
+CHIMERAX_EXECUTABLE = "/Applications/ChimeraX-1.9.app/Contents/bin/ChimeraX"
+CHIMERAX_FLAGS = ["--nogui", "--offscreen", "--script"]
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "morph_worker.py")
+MARKER = "@@morph@@"
+
+
+def read_manifest(path, defaults):
+    jobs = []
+    with open(path, "r", encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            job = {**defaults, **json.loads(line)}
+            job.setdefault("id", f"job{n:04d}")
+            if not job.get("states") and not (job.get("pdb1") and job.get("pdb2")):
+                raise ValueError(f"{path}:{n}: a job needs pdb1 and pdb2, or states")
+            jobs.append(job)
+    return jobs
+
+
+def resolve_outputs(job, output_dir):
+    # true -> default path inside the output folder, relative paths -> inside the output folder
+    for key, suffix in (("movie", ".mp4"), ("export", ".morph")):
+        value = job.get(key)
+        if value is True:
+            value = f"{job['id']}{suffix}"
+        if value:
+            job[key] = os.path.abspath(os.path.join(output_dir, value))
+        else:
+            job.pop(key, None)
+    if "movie" not in job and "export" not in job:
+        job["export"] = os.path.abspath(os.path.join(output_dir, f"{job['id']}.morph"))
+    return job
+
+
+class Worker:
+    # one headless ChimeraX process; protocol lines are picked out of its stdout by a reader thread
+    def __init__(self, name, command):
+        self.name = name
+        self.command = command
+        self.messages = queue.Queue()
+        self.log = deque(maxlen=40)
+        self.jobs_done = 0
+        self.process = subprocess.Popen(
+            command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            text=True, bufsize=1,
+        )
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        for line in self.process.stdout:
+            if line.startswith(MARKER):
+                try:
+                    self.messages.put(json.loads(line[len(MARKER):]))
+                except ValueError:
+                    self.log.append(line.rstrip())
+            else:
+                self.log.append(line.rstrip())
+        self.messages.put(None) # the process is gone
+
+    def wait_message(self, timeout):
+        message = self.messages.get(timeout=timeout)
+        if message is None:
+            raise RuntimeError(f"exited with code {self.process.wait()}")
+        return message
+
+    def submit(self, job):
+        self.process.stdin.write(json.dumps(job) + "\n")
+        self.process.stdin.flush()
+
+    def log_tail(self, lines=15):
+        return "\n".join(list(self.log)[-lines:])
+
+    def stop(self):
+        try:
+            self.process.stdin.write(json.dumps({"quit": True}) + "\n")
+            self.process.stdin.close()
+            self.process.wait(timeout=30)
+        except Exception:
+            self.process.kill()
+
+
+def serve_jobs(name, command, jobs, results, startup_timeout, job_timeout, lock, report):
+    worker = None
+    while True:
+        try:
+            job = jobs.get_nowait()
+        except queue.Empty:
+            break
+        start = time.perf_counter()
+        try:
+            if worker is None:
+                worker = Worker(name, command)
+                worker.wait_message(startup_timeout) # the ready message
+            worker.submit(job)
+            result = worker.wait_message(job_timeout)
+            worker.jobs_done += 1
+        except Exception as e:
+            reason = "timed out" if isinstance(e, queue.Empty) else str(e)
+            result = {"id": job["id"], "status": "failed", "error": f"worker {reason}"}
+            if worker is not None:
+                result["log_tail"] = worker.log_tail()
+                worker.process.kill()
+                worker = None # a fresh worker takes the next job
+        result.update(id=job["id"], worker=name, total_time=round(time.perf_counter() - start, 3))
+        with lock:
+            results.append(result)
+            report.write(json.dumps(result) + "\n")
+            report.flush()
+            status = "✅" if result["status"] == "ok" else "❌"
+            print(f"{status} {job['id']} on {name} in {result['total_time']:.1f} s"
+                  + ("" if result["status"] == "ok" else f": {result.get('error')}"))
+    if worker is not None:
+        worker.stop()
+
+
+def batch_morphing(manifest, output_dir="morph_batch", workers=2, chimerax=CHIMERAX_EXECUTABLE,
+                   flags=CHIMERAX_FLAGS, defaults=None, startup_timeout=300, job_timeout=3600):
+    """
+    Runs all jobs of the manifest on a pool of headless ChimeraX workers.
+
+    Returns:
+        list: one result per job (status, timings, outputs or error + log tail)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    job_list = [resolve_outputs(job, output_dir) for job in read_manifest(manifest, defaults or {})]
+    print(f"🎭 {len(job_list)} morphs on {workers} headless ChimeraX workers")
+
+    jobs = queue.Queue()
+    for job in job_list:
+        jobs.put(job)
+    command = [chimerax] + list(flags) + [WORKER_SCRIPT]
+    results, lock = [], threading.Lock()
+    start = time.perf_counter()
+
+    report_path = os.path.join(output_dir, "batch_report.jsonl")
+    with open(report_path, "w", encoding="utf-8") as report:
+        threads = [
+            threading.Thread(target=serve_jobs, args=(f"worker{i}", command, jobs, results,
+                                                      startup_timeout, job_timeout, lock, report))
+            for i in range(max(1, min(workers, len(job_list))))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    wall_time = time.perf_counter() - start
+    ok = sum(1 for r in results if r["status"] == "ok")
+    print(f"📊 {ok} of {len(results)} morphs done in {wall_time:.1f} s, report: {report_path}")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless batch morphing over a manifest of structure pairs")
+    parser.add_argument("manifest", help="JSON lines, one morph job per line")
+    parser.add_argument("--output-dir", default="morph_batch")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--chimerax", default=CHIMERAX_EXECUTABLE, help="ChimeraX (or stub) executable")
+    parser.add_argument("--strategy", help="default strategy of the jobs (rmsd, chain, none)")
+    parser.add_argument("--rmsd-cutoff", type=float, help="default rmsd_cutoff of the jobs")
+    parser.add_argument("--frames", type=int, help="default number of frames of the jobs")
+    parser.add_argument("--engine", help="default morph engine of the jobs (chimerax, numpy)")
+    parser.add_argument("--movie", action="store_true", help="record an mp4 movie of every morph")
+    parser.add_argument("--job-timeout", type=float, default=3600)
+    args = parser.parse_args(argv)
+
+    defaults = {key: value for key, value in (
+        ("strategy", args.strategy), ("rmsd_cutoff", args.rmsd_cutoff),
+        ("frames", args.frames), ("engine", args.engine), ("movie", args.movie or None),
+    ) if value is not None}
+    results = batch_morphing(args.manifest, args.output_dir, args.workers, args.chimerax,
+                             defaults=defaults, job_timeout=args.job_timeout)
+    return 0 if all(r["status"] == "ok" for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
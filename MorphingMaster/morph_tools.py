@@ -0,0 +1,523 @@
+# Morph tools - the headless numerics behind the Master Of Morphing
+# Everything here works on plain NumPy arrays (no ChimeraX required),
+# so it can be tested and benchmarked outside of the ChimeraX session.
+# This script is developed exclusively for non-commercial educational purposes.
+# The Visual Hub. © 2025 - All Rights Reserved.
+import os
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+
+def residue_index(numbers, coords):
+    """
+    Correspondence index of one chain: residue numbers sorted once, with their coordinates.
+
+    Parameters:
+        numbers: residue number of every atom (e.g. one CA per residue).
+        coords: (n_atoms, 3) coordinates in the same order.
+
+    Returns:
+        tuple: (numbers, coords) sorted by residue number, duplicates (insertion codes) keep the first.
+    """
+    numbers = np.asarray(numbers)
+    order = np.argsort(numbers, kind="stable")
+    numbers, first = np.unique(numbers[order], return_index=True)
+    return numbers, np.asarray(coords, dtype=float)[order][first]
+
+
+def pack_residues(indices):
+    """
+    Packs the residue indices of several chains onto the union of their residue numbers.
+
+    Parameters:
+        indices (list): (numbers, coords) per chain, as returned by residue_index.
+
+    Returns:
+        tuple: (xyz, mask, slots) with shapes (n_chains, n_slots, 3), (n_chains, n_slots) and (n_slots,)
+    """
+    slots = np.unique(np.concatenate([numbers for numbers, _ in indices])) if indices else np.zeros(0, int)
+    xyz = np.zeros((len(indices), len(slots), 3))
+    mask = np.zeros((len(indices), len(slots)), dtype=bool)
+    for i, (numbers, coords) in enumerate(indices):
+        positions = np.searchsorted(slots, numbers)
+        xyz[i, positions] = coords
+        mask[i, positions] = True
+    return xyz, mask, slots
+
+
+def common_residues(ref_index, target_index):
+    """
+    Residues present in both chains.
+
+    Returns:
+        tuple: (numbers, ref_positions, target_positions) - positions index the two residue indices.
+    """
+    return np.intersect1d(ref_index[0], target_index[0], assume_unique=True, return_indices=True)
+
+
+def rmsd_matrix(ref_xyz, ref_mask, target_xyz, target_mask, superpose=False, min_pairs=3):
+    """
+    RMSD between every reference and every target chain in one batched pass.
+
+    Both inputs are grids over the same residue numbers (see pack_residues): two chains
+    are compared on the residues present in both of them.
+    Pairs sharing fewer than min_pairs residues get inf.
+
+    Parameters:
+        ref_xyz, target_xyz: (n_ref, n_slots, 3) and (n_target, n_slots, 3) coordinates.
+        ref_mask, target_mask: boolean presence of each slot.
+        superpose (bool): if True, each pair is optimally superimposed (Kabsch) before scoring.
+        min_pairs (int): minimal number of shared slots for a meaningful RMSD.
+
+    Returns:
+        np.ndarray: (n_target, n_ref) RMSD matrix.
+    """
+    wa = target_mask.astype(float)
+    wb = ref_mask.astype(float)
+    a = target_xyz * wa[..., None] # absent slots contribute nothing to the sums below
+    b = ref_xyz * wb[..., None]
+
+    n = wa @ wb.T  # shared slots of every pair
+    qa = (a * a).sum(-1) @ wb.T
+    qb = wa @ (b * b).sum(-1).T
+    cross = a.reshape(len(a), -1) @ b.reshape(len(b), -1).T
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if not superpose:
+            msd = (qa + qb - 2 * cross) / n
+        else:
+            # centered sums and cross-covariance of every pair (9 matrix products in total)
+            sa = np.einsum("ikc,jk->ijc", a, wb)
+            sb = np.einsum("ik,jkc->ijc", wa, b)
+            h = np.empty(n.shape + (3, 3))
+            for c in range(3):
+                for d in range(3):
+                    h[..., c, d] = a[..., c] @ b[..., d].T
+            h -= sa[..., :, None] * sb[..., None, :] / n[..., None, None]
+            ea = qa - (sa * sa).sum(-1) / n
+            eb = qb - (sb * sb).sum(-1) / n
+
+            h = np.nan_to_num(h)
+            u, s, vt = np.linalg.svd(h)
+            d = np.sign(np.linalg.det(u @ vt))
+            s[..., 2] *= d # no reflections
+            msd = (ea + eb - 2 * s.sum(-1)) / n
+
+    rmsd = np.sqrt(np.clip(msd, 0, None))
+    rmsd[n < min_pairs] = np.inf
+    return rmsd
+
+
+def assign_chains(rmsd):
+    """
+    One-to-one assignment of target chains to reference chains with minimal total RMSD.
+
+    Returns:
+        np.ndarray: index of the assigned reference chain for every target chain (-1 if none).
+    """
+    from scipy.optimize import linear_sum_assignment
+
+    finite = np.isfinite(rmsd)
+    assigned = np.full(rmsd.shape[0], -1)
+    if not finite.any():
+        return assigned
+    cost = np.where(finite, rmsd, rmsd[finite].max() * 10 + 1)
+    rows, cols = linear_sum_assignment(cost)
+    keep = finite[rows, cols]
+    assigned[rows[keep]] = cols[keep]
+    return assigned
+
+
+def pair_atoms(ref_keys, target_keys):
+    """
+    Pairs atoms of two structures by key (e.g. chain ID, residue number and atom name).
+
+    Parameters:
+        ref_keys, target_keys (tuple): parallel arrays, one per key field, one entry per atom.
+
+    Returns:
+        tuple: (ref_positions, target_positions) of the paired atoms, in the reference atom order.
+    """
+    def as_records(keys):
+        records = np.rec.fromarrays([np.asarray(k) for k in keys], names=[f"k{i}" for i in range(len(keys))])
+        unique, first = np.unique(records, return_index=True) # duplicated keys keep their first atom
+        return unique, first
+
+    ref_unique, ref_first = as_records(ref_keys)
+    target_unique, target_first = as_records(target_keys)
+    common_dtype = np.result_type(ref_unique.dtype, target_unique.dtype)
+    _, r, t = np.intersect1d(ref_unique.astype(common_dtype), target_unique.astype(common_dtype),
+                             assume_unique=True, return_indices=True)
+    ref_positions, target_positions = ref_first[r], target_first[t]
+    order = np.argsort(ref_positions)
+    return ref_positions[order], target_positions[order]
+
+
+def kabsch(ref_xyz, target_xyz):
+    """
+    Optimal rotation and centroids superimposing ref_xyz onto target_xyz:
+    target ~ (ref - ref_center) @ rotation.T + target_center
+
+    Returns:
+        tuple: (rotation, ref_center, target_center)
+    """
+    ref_center = ref_xyz.mean(0)
+    target_center = target_xyz.mean(0)
+    h = (ref_xyz - ref_center).T @ (target_xyz - target_center)
+    u, _, vt = np.linalg.svd(h)
+    d = np.sign(np.linalg.det(vt.T @ u.T))
+    rotation = vt.T @ np.diag([1.0, 1.0, d]) @ u.T
+    return rotation, ref_center, target_center
+
+
+def rotation_powers(rotation, t):
+    """
+    SLERP from the identity to rotation: one rotation matrix per fraction in t (shape (n, 3, 3)).
+    """
+    # rotation -> unit quaternion (w, x, y, z), largest component first for stability
+    m = rotation
+    trace = np.trace(m)
+    candidates = np.array([trace, m[0, 0], m[1, 1], m[2, 2]])
+    i = int(np.argmax(candidates))
+    if i == 0:
+        w = np.sqrt(1.0 + trace) / 2
+        q = np.array([w, (m[2, 1] - m[1, 2]) / (4 * w), (m[0, 2] - m[2, 0]) / (4 * w), (m[1, 0] - m[0, 1]) / (4 * w)])
+    else:
+        j, k = (i % 3) + 1, ((i + 1) % 3) + 1
+        v = np.zeros(4)
+        v[i] = np.sqrt(max(1.0 + 2 * m[i - 1, i - 1] - trace, 0.0)) / 2
+        v[0] = (m[k - 1, j - 1] - m[j - 1, k - 1]) / (4 * v[i])
+        v[j] = (m[j - 1, i - 1] + m[i - 1, j - 1]) / (4 * v[i])
+        v[k] = (m[k - 1, i - 1] + m[i - 1, k - 1]) / (4 * v[i])
+        q = v
+    if q[0] < 0:
+        q = -q # shortest path
+
+    # axis-angle of the quaternion, scaled by t (Rodrigues formula for all fractions at once)
+    sin_half = np.linalg.norm(q[1:])
+    t = np.asarray(t, dtype=float)
+    if sin_half < 1e-12:
+        return np.broadcast_to(np.eye(3), (len(t), 3, 3)).copy()
+    axis = q[1:] / sin_half
+    angle = 2 * np.arctan2(sin_half, q[0]) * t
+    k = np.array([[0, -axis[2], axis[1]], [axis[2], 0, -axis[0]], [-axis[1], axis[0], 0]])
+    return (np.eye(3) + np.sin(angle)[:, None, None] * k
+            + (1 - np.cos(angle))[:, None, None] * (k @ k))
+
+
+def interpolate_coordsets(ref_xyz, target_xyz, frames, mode="linear", dtype=np.float64):
+    """
+    Morph trajectory between two paired coordinate arrays, all frames in one broadcasted operation.
+
+    Parameters:
+        ref_xyz, target_xyz: (n_atoms, 3) paired coordinates (first and last frame).
+        frames (int): number of frames, both end states included.
+        mode (str): "linear", "eased" (smoothstep timing) or "rigid"
+                    (SLERP of the superposition + linear residual motion).
+        dtype: dtype of the returned array.
+
+    Returns:
+        np.ndarray: (frames, n_atoms, 3) coordinates.
+    """
+    ref_xyz = np.asarray(ref_xyz, dtype=float)
+    target_xyz = np.asarray(target_xyz, dtype=float)
+    if ref_xyz.shape != target_xyz.shape:
+        raise ValueError(f"Paired coordinates differ in shape: {ref_xyz.shape} vs {target_xyz.shape}")
+    frames = int(frames)
+    if frames < 2:
+        raise ValueError("A morph needs at least 2 frames")
+
+    t = np.linspace(0.0, 1.0, frames)
+    if mode in ("linear", "eased"):
+        if mode == "eased":
+            t = t * t * (3 - 2 * t)
+        xyz = np.empty((frames,) + ref_xyz.shape, dtype=dtype)
+        np.multiply(t[:, None, None], target_xyz - ref_xyz, out=xyz, casting="same_kind")
+        xyz += ref_xyz.astype(dtype)
+        return xyz
+    if mode == "rigid":
+        rotation, ref_center, target_center = kabsch(ref_xyz, target_xyz)
+        local = ref_xyz - ref_center
+        # what the rigid fit cannot explain, expressed in the reference frame
+        residual = (target_xyz - target_center) @ rotation - local
+        rotations = rotation_powers(rotation, t)
+        moving = local + t[:, None, None] * residual
+        xyz = moving @ rotations.transpose(0, 2, 1)
+        xyz += ref_center + t[:, None, None] * (target_center - ref_center)
+        return xyz.astype(dtype)
+    raise ValueError(f"Unknown morph mode: {mode}")
+
+
+def preparation_key(ref_chains, target_chains, strategy, rmsd_cutoff):
+    """
+    Content key of a pairwise preparation: chain IDs, residue numbers and CA coordinates
+    of both structures plus the strategy options.
+    """
+    digest = hashlib.sha256(f"v1|{strategy}|{float(rmsd_cutoff)}".encode())
+    for chains in (ref_chains, target_chains):
+        digest.update(b"|state")
+        for chain_id, (numbers, coords) in chains:
+            digest.update(f"|{chain_id}|".encode())
+            digest.update(np.ascontiguousarray(numbers, dtype=np.int64).tobytes())
+            digest.update(np.ascontiguousarray(np.round(coords, 3), dtype=np.float32).tobytes())
+    return digest.hexdigest()
+
+
+def prepare_pair(ref_chains, target_chains, strategy="rmsd", rmsd_cutoff=5.0):
+    """
+    Headless preparation of one pair of structures: chain matching and global superposition.
+
+    Parameters:
+        ref_chains, target_chains (list): (chain_id, residue_index) per chain, CA atoms in scene coordinates.
+        strategy (str): "rmsd" (one-to-one assignment by superimposed RMSD, pairs above rmsd_cutoff pruned),
+                        "chain" (chains with the same ID) or "none" (all chains kept with their IDs).
+        rmsd_cutoff (float): cutoff of the rmsd strategy.
+
+    Returns:
+        dict: {"chain_map": {target_id: ref_id}, "rotation", "ref_center", "target_center"} (JSON friendly),
+              the fit maps the target onto the reference: ref ~ (target - target_center) @ rotation + ref_center
+    """
+    ref_ids = [chain_id for chain_id, _ in ref_chains]
+    target_ids = [chain_id for chain_id, _ in target_chains]
+
+    if strategy == "rmsd":
+        xyz, mask, _ = pack_residues([index for _, index in ref_chains + target_chains])
+        n_ref = len(ref_chains)
+        rmsd = rmsd_matrix(xyz[:n_ref], mask[:n_ref], xyz[n_ref:], mask[n_ref:], superpose=True)
+        assigned = assign_chains(rmsd)
+        chain_map = {
+            target_ids[t]: ref_ids[r] for t, r in enumerate(assigned)
+            if r >= 0 and rmsd[t, r] <= rmsd_cutoff
+        }
+    elif strategy in ("chain", "none"):
+        chain_map = {chain_id: chain_id for chain_id in target_ids if chain_id in ref_ids}
+    else:
+        raise ValueError(f"Unknown strategy mode: {strategy}")
+
+    # global fit on the CA atoms shared by the matched chains
+    ref_lookup = dict(ref_chains)
+    ref_xyz, target_xyz = [], []
+    for chain_id, index in target_chains:
+        if chain_id in chain_map:
+            ref_index = ref_lookup[chain_map[chain_id]]
+            _, r, t = common_residues(ref_index, index)
+            ref_xyz.append(ref_index[1][r])
+            target_xyz.append(index[1][t])
+    if sum(len(x) for x in ref_xyz) >= 3:
+        rotation, target_center, ref_center = kabsch(np.concatenate(target_xyz), np.concatenate(ref_xyz))
+        rotation = rotation.T # row-vector form: ref ~ (target - target_center) @ rotation + ref_center
+    else:
+        rotation, ref_center, target_center = np.eye(3), np.zeros(3), np.zeros(3)
+
+    return {
+        "strategy": strategy,
+        "chain_map": chain_map,
+        "rotation": rotation.tolist(),
+        "ref_center": np.asarray(ref_center).tolist(),
+        "target_center": np.asarray(target_center).tolist(),
+    }
+
+
+def prepare_pairs(states, strategy="rmsd", rmsd_cutoff=5.0, cache_dir=None, workers=4):
+    """
+    Prepares every consecutive pair of states in parallel, reusing cached preparations.
+
+    Parameters:
+        states (list): per state, a list of (chain_id, residue_index).
+        cache_dir (str): folder of the JSON cache (no caching if None).
+        workers (int): number of threads (NumPy releases the GIL in the heavy parts).
+
+    Returns:
+        tuple: (preparations, n_cached) - one preparation per consecutive pair.
+    """
+    keys = [preparation_key(states[i], states[i + 1], strategy, rmsd_cutoff) for i in range(len(states) - 1)]
+    preparations = [None] * len(keys)
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        for i, key in enumerate(keys):
+            try:
+                with open(os.path.join(cache_dir, f"{key}.json"), "r") as f:
+                    preparations[i] = json.load(f)
+            except (OSError, ValueError):
+                pass
+
+    missing = [i for i, p in enumerate(preparations) if p is None]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        results = pool.map(lambda i: prepare_pair(states[i], states[i + 1], strategy, rmsd_cutoff), missing)
+        for i, preparation in zip(missing, results):
+            preparations[i] = preparation
+            if cache_dir:
+                path = os.path.join(cache_dir, f"{keys[i]}.json")
+                with open(path + ".tmp", "w") as f:
+                    json.dump(preparation, f)
+                os.replace(path + ".tmp", path)
+    return preparations, len(keys) - len(missing)
+
+
+def chain_morph_trajectory(states, preparations, frames_per_step, mode="linear"):
+    """
+    One continuous morph trajectory through several states (A -> B -> C ...).
+
+    Chains of every state are renamed to the chain IDs of the first state, every state is
+    brought into the frame of the first one, and only atoms present in all states are kept.
+
+    Parameters:
+        states (list): per state, (keys, coords) - keys as (chain_ids, residue_numbers, atom_names)
+                       arrays and coords (n_atoms, 3) in scene coordinates.
+        preparations (list): prepare_pair results of the consecutive pairs.
+        frames_per_step (int): frames of every step, both end states included.
+        mode (str): interpolation mode of interpolate_coordsets.
+
+    Returns:
+        tuple: (first_state_positions, coordsets) - positions of the morphed atoms in the first state
+               and the (n_frames, n_atoms, 3) trajectory in the scene coordinates of the first state.
+    """
+    # chain IDs of every state expressed as chain IDs of the first state
+    chain_maps = [None]
+    for preparation in preparations:
+        previous = chain_maps[-1]
+        step = preparation["chain_map"]
+        if previous is None:
+            chain_maps.append(dict(step))
+        else:
+            chain_maps.append({t: previous[r] for t, r in step.items() if r in previous})
+
+    records, coords = [], []
+    for (keys, xyz), chain_map in zip(states, chain_maps):
+        chain_ids = np.asarray(keys[0])
+        keep = np.ones(len(chain_ids), dtype=bool)
+        if chain_map is not None:
+            unique_ids, inverse = np.unique(chain_ids, return_inverse=True)
+            mapped = np.array([chain_map.get(c, "") for c in unique_ids], dtype=object)[inverse]
+            keep = mapped != ""
+            chain_ids = mapped.astype(str)
+        rec = np.rec.fromarrays([chain_ids, np.asarray(keys[1]), np.asarray(keys[2])], names="chain,number,name")
+        records.append((rec, keep))
+        coords.append(np.asarray(xyz, dtype=float))
+
+    # atoms present in all states
+    uniques = []
+    for rec, keep in records:
+        unique, first = np.unique(rec[keep], return_index=True)
+        uniques.append((unique, np.flatnonzero(keep)[first]))
+    common = uniques[0][0]
+    for unique, _ in uniques[1:]:
+        common = np.intersect1d(common.astype(unique.dtype), unique)
+    if len(common) == 0:
+        raise ValueError("No atoms are shared by all states")
+    positions = [first[np.searchsorted(unique, common.astype(unique.dtype))] for unique, first in uniques]
+    order = np.argsort(positions[0])
+    positions = [p[order] for p in positions]
+
+    # bring every state into the frame of the first one by chaining the pairwise fits
+    fitted = [coords[0][positions[0]]]
+    for k in range(1, len(states)):
+        xyz = coords[k][positions[k]]
+        for preparation in reversed(preparations[:k]):
+            rotation = np.asarray(preparation["rotation"])
+            xyz = (xyz - preparation["target_center"]) @ rotation + preparation["ref_center"]
+        fitted.append(xyz)
+
+    segments = [interpolate_coordsets(a, b, frames_per_step, mode=mode) for a, b in zip(fitted[:-1], fitted[1:])]
+    coordsets = np.concatenate([segments[0]] + [s[1:] for s in segments[1:]])
+    return positions[0], coordsets
+
+
+def save_trajectory(path, coordsets, keys=None, codec="delta", keyframe_interval=25):
+    """
+    Writes a morph trajectory to a compact folder of .npy files (readable with memory mapping).
+
+    Parameters:
+        path (str): output folder, e.g. "calmodulin.morph".
+        coordsets: (n_frames, n_atoms, 3) coordinates.
+        keys (tuple): optional (chain_ids, residue_numbers, atom_names) of the atoms,
+                      used to pair the atoms with a topology on reload.
+        codec (str): "delta" - float32 keyframes + int16 quantized deltas (6 bytes per atom and frame),
+                     "float16" - half precision offsets from the trajectory center.
+        keyframe_interval (int): frames per keyframe of the delta codec.
+
+    Returns:
+        dict: the metadata written to meta.json
+    """
+    coordsets = np.asarray(coordsets, dtype=np.float64)
+    n_frames, n_atoms, _ = coordsets.shape
+    os.makedirs(path, exist_ok=True)
+    meta = {"version": 1, "codec": codec, "frames": n_frames, "atoms": n_atoms}
+
+    if codec == "delta":
+        keyframe_interval = max(1, int(keyframe_interval))
+        keyframes = coordsets[::keyframe_interval].astype(np.float32)
+        deltas = coordsets - keyframes[np.arange(n_frames) // keyframe_interval]
+        scale = max(float(np.abs(deltas).max()) / 32767, 1e-6)
+        np.save(os.path.join(path, "keyframes.npy"), keyframes)
+        np.save(os.path.join(path, "deltas.npy"), np.round(deltas / scale).astype(np.int16))
+        meta.update(keyframe_interval=keyframe_interval, scale=scale)
+    elif codec == "float16":
+        origin = coordsets.reshape(-1, 3).mean(0)
+        np.save(os.path.join(path, "frames.npy"), (coordsets - origin).astype(np.float16))
+        meta.update(origin=origin.tolist())
+    else:
+        raise ValueError(f"Unknown trajectory codec: {codec}")
+
+    if keys is not None:
+        # ChimeraX gives chain IDs and atom names as object arrays: fixed-width unicode keeps
+        # keys.npy loadable without pickle
+        chains, numbers, names = keys
+        records = np.rec.fromarrays([np.asarray(chains).astype(str), np.asarray(numbers, dtype=np.int64),
+                                     np.asarray(names).astype(str)], names="chain,number,name")
+        np.save(os.path.join(path, "keys.npy"), np.asarray(records))
+
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+class MorphTrajectory:
+    """
+    Memory-mapped reader of a trajectory written by save_trajectory.
+    Frames are decoded on demand: trajectory[i] or trajectory.coordsets(start, stop).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            self.meta = json.load(f)
+        self.codec = self.meta["codec"]
+        if self.codec == "delta":
+            self._keyframes = np.load(os.path.join(path, "keyframes.npy"), mmap_mode="r")
+            self._deltas = np.load(os.path.join(path, "deltas.npy"), mmap_mode="r")
+        elif self.codec == "float16":
+            self._frames = np.load(os.path.join(path, "frames.npy"), mmap_mode="r")
+            self._origin = np.asarray(self.meta["origin"])
+        else:
+            raise ValueError(f"Unknown trajectory codec: {self.codec}")
+        keys_path = os.path.join(path, "keys.npy")
+        self.keys = np.load(keys_path) if os.path.exists(keys_path) else None
+
+    def __len__(self):
+        return self.meta["frames"]
+
+    @property
+    def n_atoms(self):
+        return self.meta["atoms"]
+
+    def coordsets(self, start=0, stop=None):
+        """(n, n_atoms, 3) float64 coordinates of frames start..stop-1."""
+        start, stop, _ = slice(start, stop).indices(len(self))
+        if self.codec == "delta":
+            interval = self.meta["keyframe_interval"]
+            out = np.multiply(self._deltas[start:stop], self.meta["scale"], dtype=np.float64)
+            out += self._keyframes[np.arange(start, stop) // interval]
+            return out
+        out = np.asarray(self._frames[start:stop], dtype=np.float64)
+        out += self._origin
+        return out
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.coordsets(i, i + 1)[0]
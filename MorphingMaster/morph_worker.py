@@ -0,0 +1,90 @@
+# Morph worker - one headless ChimeraX session serving morph jobs of batch_morphing.py
+# Started by the batch driver as: ChimeraX --nogui --offscreen --script morph_worker.py
+# Reads one JSON job per line from stdin, answers with one "@@morph@@ {json}" line per job on stdout.
+# The session is reused between jobs (close session), so ChimeraX starts only once per worker.
+# This script is developed exclusively for non-commercial educational purposes.
+# The Visual Hub. © 2025 - All Rights Reserved.
+import os
+import sys
+import json
+import time
+import traceback
+from chimerax.core.commands import run
+
+try:
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+except NameError:
+    script_dir = os.getcwd()
+if script_dir not in sys.path:
+    sys.path.insert(0, script_dir)
+import MasterOfMorphing as mom # the module globals of the script are the per-job options
+
+MARKER = "@@morph@@"
+# job keys -> options of MasterOfMorphing.py
+JOB_OPTIONS = {
+    "strategy": "strategy_mode",
+    "rmsd_cutoff": "rmsd_cutoff",
+    "frames": "morphing_frames",
+    "engine": "morph_engine",
+    "mode": "morph_mode",
+    "export_codec": "export_codec",
+    "apply_style": "apply_style",
+}
+defaults = {name: getattr(mom, name) for name in JOB_OPTIONS.values()}
+
+def reply(message):
+    # ChimeraX may redirect sys.stdout to its log, the driver reads the real one
+    out = sys.__stdout__
+    out.write(f"{MARKER} {json.dumps(message)}\n")
+    out.flush()
+
+def record_movie(session, model, path, frames, fps=25):
+    run(session, 'movie record')
+    run(session, f'coordset #{model.id_string} 1,{frames}')
+    run(session, f'wait {frames}')
+    run(session, f'movie encode "{path}" framerate {fps}')
+
+def run_job(session, job):
+    run(session, 'close session')
+    for key, name in JOB_OPTIONS.items():
+        setattr(mom, name, job.get(key, defaults[name]))
+    mom.morphing_frames = str(mom.morphing_frames)
+    mom.export_morph_path = job.get("export", "")
+    mom.pdb_states = job.get("states", [])
+
+    if mom.pdb_states:
+        mom.ChainOfMorphing(session, mom.pdb_states)
+    else:
+        mom.MasterOfMorphing(session, job["pdb1"], job["pdb2"])
+
+    # craft_morph logs its errors instead of raising them
+    model = mom.find_morph_model(session)
+    if model is None:
+        raise RuntimeError("no morphing model was produced")
+    outputs = {}
+    if job.get("export"):
+        outputs["export"] = job["export"]
+    if job.get("movie"):
+        record_movie(session, model, job["movie"], model.num_coordsets, job.get("fps", 25))
+        outputs["movie"] = job["movie"]
+    return {"atoms": model.num_atoms, "frames": model.num_coordsets, "outputs": outputs}
+
+def serve(session):
+    reply({"ready": True, "pid": os.getpid()})
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        job = json.loads(line)
+        if job.get("quit"):
+            break
+        start = time.perf_counter()
+        try:
+            result = run_job(session, job)
+            reply({"id": job.get("id"), "status": "ok", "wall_time": time.perf_counter() - start, **result})
+        except Exception as e:
+            reply({"id": job.get("id"), "status": "failed", "wall_time": time.perf_counter() - start,
+                   "error": f"{type(e).__name__}: {e}", "traceback": traceback.format_exc()[-2000:]})
+    run(session, 'exit')
+
+serve(session)
@@ -0,0 +1,43 @@
+# Stub morph worker - speaks the morph_worker.py protocol without ChimeraX, for the batch tests
+# Started as: python stub_worker.py [ignored args]
+# The "stub" key of a job picks what happens: "ok" (default), "fail", "crash" (exit code 3) or "hang".
+import os
+import sys
+import json
+import time
+
+MARKER = "@@morph@@"
+
+def reply(message):
+    sys.stdout.write(f"{MARKER} {json.dumps(message)}\n")
+    sys.stdout.flush()
+
+def serve():
+    print("stub worker starting") # log noise the driver must ignore
+    reply({"ready": True, "pid": os.getpid()})
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        job = json.loads(line)
+        if job.get("quit"):
+            break
+        behaviour = job.get("stub", "ok")
+        print(f"job {job.get('id')}: {behaviour}", flush=True)
+        if behaviour == "crash":
+            print("stub worker crashing", flush=True)
+            sys.exit(3)
+        if behaviour == "hang":
+            time.sleep(600)
+        if behaviour == "fail":
+            reply({"id": job.get("id"), "status": "failed", "error": "RuntimeError: stub failure"})
+            continue
+        outputs = {}
+        if job.get("export"):
+            os.makedirs(job["export"], exist_ok=True)
+            outputs["export"] = job["export"]
+        reply({"id": job.get("id"), "status": "ok", "pid": os.getpid(), "frames": job.get("frames", 0),
+               "outputs": outputs})
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,48 @@
+# Batch driver against a stub worker executable (no ChimeraX needed)
+# Run from the MorphingMaster folder: python -m pytest tests
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from batch_morphing import batch_morphing
+
+STUB_WORKER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stub_worker.py")
+
+
+def test_batch_ok_failed_crashed_and_timed_out_jobs(tmp_path):
+    jobs = [
+        {"id": "ok1", "stub": "ok"},
+        {"id": "failed", "stub": "fail"},
+        {"id": "crashed", "stub": "crash"},
+        {"id": "ok2", "stub": "ok"},
+        {"id": "hung", "stub": "hang"},
+        {"id": "ok3", "stub": "ok"},
+    ]
+    manifest = tmp_path / "manifest.jsonl"
+    manifest.write_text("".join(json.dumps({"pdb1": "1exr", "pdb2": "1qs7", **job}) + "\n" for job in jobs))
+    output_dir = tmp_path / "out"
+
+    # a single worker runs the jobs in manifest order; the stub executable replaces ChimeraX
+    results = batch_morphing(str(manifest), str(output_dir), workers=1, chimerax=sys.executable,
+                             flags=[STUB_WORKER], defaults={"frames": 5}, startup_timeout=30, job_timeout=3)
+    by_id = {r["id"]: r for r in results}
+    assert [r["id"] for r in results] == [job["id"] for job in jobs]
+
+    assert {i: by_id[i]["status"] for i in by_id} == {
+        "ok1": "ok", "failed": "failed", "crashed": "failed", "ok2": "ok", "hung": "failed", "ok3": "ok"}
+    assert by_id["ok1"]["frames"] == 5
+    assert os.path.isdir(by_id["ok1"]["outputs"]["export"])
+    assert by_id["failed"]["error"] == "RuntimeError: stub failure"
+    assert by_id["crashed"]["error"] == "worker exited with code 3"
+    assert "stub worker crashing" in by_id["crashed"]["log_tail"]
+    assert by_id["hung"]["error"] == "worker timed out"
+
+    # a fresh worker process takes over after the crash and after the timeout
+    assert by_id["ok1"]["pid"] != by_id["ok2"]["pid"] != by_id["ok3"]["pid"]
+    assert all(r["worker"] == "worker0" for r in results)
+
+    # the report has one line per job, as returned
+    with open(output_dir / "batch_report.jsonl", "r", encoding="utf-8") as f:
+        report = [json.loads(line) for line in f]
+    assert report == results
@@ -0,0 +1,37 @@
+# Round trips of the headless morph tools (plain NumPy, no ChimeraX needed)
+# Run from the MorphingMaster folder: python -m pytest tests
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from morph_tools import save_trajectory, MorphTrajectory
+
+
+def object_keys():
+    # the dtypes ChimeraX returns for Residues.chain_ids / Atoms.names
+    chains = np.array(["A", "A", "B", "AB"], dtype=object)
+    numbers = np.array([1, 2, 2, 10], dtype=np.int32)
+    names = np.array(["CA", "CB", "CA", "OXT"], dtype=object)
+    return chains, numbers, names
+
+
+@pytest.mark.parametrize("codec", ["delta", "float16"])
+def test_trajectory_round_trip_with_object_keys(tmp_path, codec):
+    rng = np.random.default_rng(0)
+    coordsets = np.cumsum(rng.normal(size=(30, 4, 3)), axis=0)
+    path = str(tmp_path / "test.morph")
+    save_trajectory(path, coordsets, keys=object_keys(), codec=codec, keyframe_interval=7)
+
+    trajectory = MorphTrajectory(path)  # np.load without allow_pickle
+    assert len(trajectory) == 30 and trajectory.n_atoms == 4
+    assert trajectory.keys.dtype.names == ("chain", "number", "name")
+    assert trajectory.keys.dtype.hasobject is False
+    chains, numbers, names = object_keys()
+    assert trajectory.keys["chain"].tolist() == chains.tolist()
+    assert trajectory.keys["number"].tolist() == numbers.tolist()
+    assert trajectory.keys["name"].tolist() == names.tolist()
+    tolerance = 1e-3 if codec == "delta" else 5e-2
+    np.testing.assert_allclose(trajectory.coordsets(), coordsets, atol=tolerance)
+    np.testing.assert_allclose(trajectory[-1], coordsets[-1], atol=tolerance)
@@ -12,6 +12,11 @@ import random
 from datetime import datetime
 import subprocess
 import tempfile
+import json
+import hashlib
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 
 # Main options:
 project = "TopVisual" # a name of generated image
@@ -62,6 +67,13 @@ structure_list = [
 # Activated toggles
 visual = True # Desactivate and the script do nothing !
 delete_old_images = True
+# Incremental build: every image gets a content key (structure + all visual options)
+# and is rendered only if no output with that key exists yet (it wins over delete_old_images)
+incremental_build = True
+manifest_name = "visual_manifest.json" # kept inside the images folder
+# Job journal: one JSON line per render with the command, exit code, wall time, output size and stderr tail
+journal_name = "render_journal.jsonl" # kept inside the images folder
+resume_jobs = False # continue only the unfinished or failed jobs of the previous run (keeps the folder)
 
 # A current time stamp on the visual for the autenticite
 timestamp = datetime.now().strftime("%d%m%Y_%H%M")
@@ -86,11 +98,68 @@ resolutions = {
 
 selected_res = "4k"  #
 
+# Tiled rendering (recommended for 8k): the frame is split into tiles_x * tiles_y off-axis tiles,
+# rendered by up to tile_workers ChimeraX processes in parallel and stitched row by row into the PNG
+# NB: the image width must be divisible by tiles_x and the height by tiles_y
+tiled_render = False
+tiles_x = 4
+tiles_y = 4
+tile_workers = 4
+
+# ChimeraX commands used for every structure (part of the content key of each image)
+chimerax_template = """
+        open {structure}
+        preset ghost
+        set bgcolor {bg_color}
+        style ~protein ball
+        color protein {surface_color} transparency 77 target s
+        color protein {cartoon_color} target c
+        color @C* goldenrod target a
+        color @H* moccasin target a
+        color @O* firebrick target a
+        color @N* royalblue target a
+        hide pseudobonds
+        zoom {zoom}
+        save {output_image} supersample {supersampling} width {img_width} height {img_height}
+        exit
+        """
+
+# Python script executed by every tile process: same scene as the full frame,
+# then an off-axis camera that sees only one tile of it
+tile_script_template = """
+from math import atan, tan, radians, degrees
+from chimerax.core.commands import run
+from chimerax.graphics import MonoCamera
+
+for command in {commands!r}:
+    run(session, command)
+
+class TileCamera(MonoCamera):
+    # the frustum is shifted by whole pixels, supersampling jitter is kept on top of it
+    def pixel_shift(self, view_num=None):
+        sx, sy = MonoCamera.pixel_shift(self, view_num)
+        return (sx + {shift_x}, sy + {shift_y})
+
+view = session.main_view
+full_camera = view.camera
+tile_camera = TileCamera()
+tile_camera.position = full_camera.position
+tile_camera.field_of_view = degrees(2 * atan(tan(radians(full_camera.field_of_view) / 2) / {tiles_x}))
+view.camera = tile_camera
+
+run(session, "save {tile_image} supersample {supersampling} width {tile_width} height {tile_height}")
+run(session, "exit")
+"""
+
 ############ THE MAIN FUNCTIONS ########################
 # 1 - Delete the folder with old images (controlled by bool delete_old_images)
 def remove_old_crafts():
 
-    if delete_old_images:
+    if resume_jobs:
+        print("⏯️ Resuming: only unfinished or failed visuals will be rendered.")
+    elif incremental_build:
+        print("♻️ Incremental build: only new or modified visuals will be rendered.")
+    elif delete_old_images:
         print("🧹 Removing previously generated visuals...")
         time.sleep(0.5)
 
@@ -114,42 +183,322 @@ def remove_old_crafts():
         print(f"❌ Error creating '{abs_images_dir}/': {e}")
 
 
-# 2 - Craft visuals using ChimeraX, controlled by the bool visual in the main function
+# 2 - Content keys and manifest for the incremental build (controlled by the bool incremental_build)
+def visual_params(structure):
+    img_width, img_height = resolutions[selected_res]
+    return {
+        "structure": structure,
+        "surface_color": surface_color,
+        "cartoon_color": cartoon_color,
+        "bg_color": bg_color,
+        "zoom": zoom,
+        "supersampling": supersampling,
+        "width": img_width,
+        "height": img_height,
+        "template": chimerax_template,
+    }
+
+def content_key(params):
+    # the same structure rendered with the same options always gets the same key
+    blob = json.dumps(params, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+def load_manifest():
+    manifest_path = os.path.join(abs_images_dir, manifest_name)
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f).get("outputs", {})
+    except FileNotFoundError:
+        return {}
+    except (ValueError, OSError) as e:
+        print(f"⚠️ Could not read '{manifest_path}', starting a new one: {e}")
+        return {}
+
+def save_manifest(outputs):
+    # write to a temporary file first so an interrupted run never leaves a broken manifest
+    manifest_path = os.path.join(abs_images_dir, manifest_name)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": 1, "outputs": outputs}, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, manifest_path)
+
+def collect_garbage(outputs, live_keys):
+    # remove images whose key is no longer produced by the current options
+    for key in sorted(set(outputs) - set(live_keys)):
+        stale_path = os.path.join(abs_images_dir, outputs[key]["file"])
+        try:
+            os.remove(stale_path)
+            print(f"🗑️ Removed stale visual {outputs[key]['file']}")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"❌ Error removing '{stale_path}': {e}")
+            continue
+        del outputs[key]
+
+# 3 - Tiled rendering: parallel off-axis tiles stitched by a streaming PNG writer (controlled by the bool tiled_render)
+class StreamingPNGWriter:
+    # writes the PNG scanline by scanline, so the full canvas never has to be in memory
+    def __init__(self, path, width, height, mode):
+        self.width = width
+        self.height = height
+        self.channels = {"RGB": 3, "RGBA": 4}[mode]
+        self.rows_written = 0
+        self.compressor = zlib.compressobj(6)
+        self.file = open(path, "wb")
+        self.file.write(b"\x89PNG\r\n\x1a\n")
+        color_type = 2 if mode == "RGB" else 6
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0))
+
+    def _chunk(self, tag, data):
+        self.file.write(struct.pack(">I", len(data)))
+        self.file.write(tag + data)
+        self.file.write(struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF))
+
+    def write_row(self, row):
+        # each scanline starts with the filter type (0 = none)
+        data = self.compressor.compress(b"\x00" + row)
+        if data:
+            self._chunk(b"IDAT", data)
+        self.rows_written += 1
+
+    def close(self):
+        if self.rows_written != self.height:
+            self.file.close()
+            raise ValueError(f"PNG expects {self.height} rows, got {self.rows_written}")
+        self._chunk(b"IDAT", self.compressor.flush())
+        self._chunk(b"IEND", b"")
+        self.file.close()
+
+def tile_commands(structure, img_width, img_height):
+    # scene setup of the regular render without its save/exit lines
+    full = chimerax_template.format(
+        structure=structure, bg_color=bg_color,
+        surface_color=surface_color, cartoon_color=cartoon_color,
+        zoom=zoom, output_image="-", supersampling=supersampling,
+        img_width=img_width, img_height=img_height,
+    )
+    lines = [line.strip() for line in full.splitlines()]
+    return [line for line in lines if line and line.split()[0] not in ("save", "exit")]
+
+def render_tile(command):
+    return subprocess.run(command, capture_output=True, text=True)
+
+def render_tiled(structure, output_image, img_width, img_height):
+    if img_width % tiles_x or img_height % tiles_y:
+        raise ValueError(f"{img_width}x{img_height} cannot be split into {tiles_x}x{tiles_y} equal tiles")
+    from PIL import Image # only the tiled mode needs Pillow (to decode the tiles)
+
+    tile_width, tile_height = img_width // tiles_x, img_height // tiles_y
+    commands = tile_commands(structure, img_width, img_height)
+    tiles_dir = tempfile.mkdtemp(prefix=f"{project}_{structure}_tiles_")
+    print(f"🧩 The {structure} is split into {tiles_x}x{tiles_y} tiles of {tile_width}x{tile_height}")
+
+    try:
+        with ThreadPoolExecutor(max_workers=tile_workers) as pool:
+            futures = {}
+            for j in range(tiles_y):
+                for i in range(tiles_x):
+                    tile_image = os.path.join(tiles_dir, f"tile_{j:02d}_{i:02d}.png")
+                    # pixel_shift moves the projected scene (+y is up): the tile center is brought
+                    # to the middle of the tile window, i.e. minus its offset from the frame center
+                    shift_x = img_width / 2 - (i + 0.5) * tile_width
+                    shift_y = (j + 0.5) * tile_height - img_height / 2
+                    script_path = os.path.join(tiles_dir, f"tile_{j:02d}_{i:02d}.py")
+                    with open(script_path, "w") as script_file:
+                        script_file.write(tile_script_template.format(
+                            commands=commands, shift_x=shift_x, shift_y=shift_y,
+                            tiles_x=tiles_x, tile_image=tile_image, supersampling=supersampling,
+                            tile_width=tile_width, tile_height=tile_height,
+                        ))
+                    command = [chimerax_executable, script_path]
+                    futures[(j, i)] = (pool.submit(render_tile, command), tile_image)
+
+            # stitch each row of tiles as soon as it is ready, while the next rows are still rendering
+            writer = None
+            commands_run = []
+            try:
+                for j in range(tiles_y):
+                    row_tiles = []
+                    for i in range(tiles_x):
+                        future, tile_image = futures[(j, i)]
+                        result = future.result()
+                        if result.returncode != 0 or not os.path.isfile(tile_image):
+                            raise RuntimeError(f"tile {i},{j} of {structure} was not rendered "
+                                               f"(exit {result.returncode}): {stderr_tail(result.stderr)}")
+                        with Image.open(tile_image) as tile:
+                            if writer is None:
+                                mode = "RGBA" if tile.mode in ("RGBA", "LA", "P") else "RGB"
+                                writer = StreamingPNGWriter(output_image, img_width, img_height, mode)
+                            if tile.size != (tile_width, tile_height):
+                                raise RuntimeError(f"tile {i},{j} of {structure} has size {tile.size}")
+                            row_tiles.append(tile.convert(mode).tobytes())
+                        os.remove(tile_image)
+                        commands_run.append(result.args)
+
+                    stride = tile_width * writer.channels
+                    for y in range(tile_height):
+                        writer.write_row(b"".join(t[y * stride:(y + 1) * stride] for t in row_tiles))
+                    del row_tiles
+                writer.close()
+                return commands_run, 0, ""
+            except BaseException:
+                for future, _ in futures.values():
+                    future.cancel()
+                if writer is not None and not writer.file.closed:
+                    writer.file.close()
+                if os.path.exists(output_image):
+                    os.remove(output_image)
+                raise
+    finally:
+        shutil.rmtree(tiles_dir, ignore_errors=True)
+
+def stderr_tail(stderr, lines=20):
+    return "\n".join((stderr or "").strip().splitlines()[-lines:])
+
+# the regular render: one ChimeraX process draws the whole frame
+def render_single(structure, output_image, img_width, img_height):
+    chimerax_commands = chimerax_template.format(
+        structure=structure, bg_color=bg_color,
+        surface_color=surface_color, cartoon_color=cartoon_color,
+        zoom=zoom, output_image=output_image, supersampling=supersampling,
+        img_width=img_width, img_height=img_height,
+    )
+
+    with tempfile.NamedTemporaryFile(mode='w', suffix=".cxc", delete=False) as script_file:
+        script_file.write(chimerax_commands)
+        script_path = script_file.name
+
+    command = [chimerax_executable, structure, script_path]
+    result = subprocess.run(command, capture_output=True, text=True)
+    return command, result.returncode, result.stderr
+
+# 4 - Job journal (JSONL) with per-structure timing and the resume option (controlled by the bool resume_jobs)
+def journal_path():
+    return os.path.join(abs_images_dir, journal_name)
+
+def append_journal(record):
+    # flushed to disk after every job, so a crash never loses the finished ones
+    with open(journal_path(), "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+def load_finished_jobs():
+    # the latest "done" record of each job wins; jobs without one were interrupted
+    latest = {}
+    try:
+        with open(journal_path(), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue # a line cut by the crash
+                if record.get("event") == "done":
+                    latest[record["key"]] = record
+    except FileNotFoundError:
+        pass
+    return {
+        key: record for key, record in latest.items()
+        if record["status"] == "ok" and os.path.isfile(record["output"])
+    }
+
+def run_job(structure, key, output_image, img_width, img_height):
+    append_journal({"event": "start", "key": key, "structure": structure,
+                    "output": output_image, "time": datetime.now().isoformat(timespec="seconds")})
+    start = time.perf_counter()
+    try:
+        if tiled_render:
+            command, returncode, stderr = render_tiled(structure, output_image, img_width, img_height)
+        else:
+            command, returncode, stderr = render_single(structure, output_image, img_width, img_height)
+    except Exception as e:
+        command, returncode, stderr = None, None, str(e)
+    wall_time = time.perf_counter() - start
+
+    produced = os.path.isfile(output_image)
+    record = {
+        "event": "done",
+        "key": key,
+        "structure": structure,
+        "output": output_image,
+        "command": command,
+        "exit_code": returncode,
+        "status": "ok" if returncode == 0 and produced else "failed",
+        "wall_time": round(wall_time, 3),
+        "output_size": os.path.getsize(output_image) if produced else 0,
+        "stderr_tail": stderr_tail(stderr),
+        "time": datetime.now().isoformat(timespec="seconds"),
+    }
+    append_journal(record)
+
+    if record["status"] == "ok":
+        print(f"✅ {structure} rendered in {wall_time:.1f} s ({record['output_size'] / 1e6:.1f} MB)")
+    else:
+        print(f"❌ {structure} failed (exit code {returncode}): {record['stderr_tail'] or 'no image produced'}")
+    return record
+
+# 5 - Craft visuals using ChimeraX, controlled by the bool visual in the main function
 def craft_visual():
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    outputs = load_manifest() if incremental_build else {}
+    finished = load_finished_jobs() if resume_jobs else {}
+    live_keys = []
+    skipped = 0
+    records = []
+    run_start = time.perf_counter()
 
     for structure, _ in structure_list:
         # pre-processing ..
         cool_picture = random.choice(emoji_list)
         img_width, img_height = resolutions[selected_res]
+        params = visual_params(structure)
+        key = content_key(params)
+        live_keys.append(key)
+
+        if key in finished:
+            print(f"⏭️ The {structure} was already rendered ({os.path.basename(finished[key]['output'])})")
+            skipped += 1
+            continue
+
+        if incremental_build:
+            output_name = f"{project}_{structure}_{key[:12]}.png"
+            if key in outputs and os.path.isfile(os.path.join(abs_images_dir, outputs[key]["file"])):
+                print(f"⏭️ The {structure} is up to date ({outputs[key]['file']})")
+                skipped += 1
+                continue
+        else:
+            output_name = f"{project}_{structure}_{timestamp}.png"
 
         print(f"{cool_picture} The {structure} is going to be visualized in {selected_res}")
         
-        output_image = os.path.join(abs_images_dir, f"{project}_{structure}_{timestamp}.png")
+        output_image = os.path.join(abs_images_dir, output_name)
 
-        chimerax_commands = f"""
-        open {structure}
-        preset ghost
-        set bgcolor {bg_color}
-        style ~protein ball
-        color protein {surface_color} transparency 77 target s
-        color protein {cartoon_color} target c
-        color @C* goldenrod target a
-        color @H* moccasin target a
-        color @O* firebrick target a
-        color @N* royalblue target a
-        hide pseudobonds
-        zoom {zoom}
-        save {output_image} supersample {supersampling} width {img_width} height {img_height}
-        exit
-        """
+        record = run_job(structure, key, output_image, img_width, img_height)
+        records.append(record)
+
+        # register the image only if ChimeraX really produced it
+        if incremental_build and record["status"] == "ok":
+            params.pop("template")
+            outputs[key] = {"file": output_name, "params": params}
+            save_manifest(outputs)
 
-        with tempfile.NamedTemporaryFile(mode='w', suffix=".cxc", delete=False) as script_file:
-            script_file.write(chimerax_commands)
-            script_path = script_file.name
+    if incremental_build:
+        collect_garbage(outputs, live_keys)
+        save_manifest(outputs)
+        print(f"♻️ {skipped} of {len(structure_list)} visuals were already up to date.")
 
-        command = [chimerax_executable, structure, script_path]
-        subprocess.run(command, capture_output=True, text=True)
+    # aggregate throughput of this run
+    run_time = time.perf_counter() - run_start
+    rendered = sum(1 for r in records if r["status"] == "ok")
+    failed = len(records) - rendered
+    per_hour = rendered / run_time * 3600 if run_time > 0 else 0.0
+    append_journal({"event": "summary", "rendered": rendered, "failed": failed, "skipped": skipped,
+                    "wall_time": round(run_time, 3), "images_per_hour": round(per_hour, 1),
+                    "time": datetime.now().isoformat(timespec="seconds")})
+    print(f"📊 {rendered} rendered, {failed} failed, {skipped} skipped in {run_time:.1f} s ({per_hour:.1f} images/hour)")
+    if failed:
+        print(f"⏯️ Set resume_jobs = True to retry only the failed visuals (journal: {journal_path()})")
 
     print("🔮 Work completed, Master!")
 
@@ -0,0 +1,77 @@
+# Stub ChimeraX - runs the scripts of VisualSubprocess.py without ChimeraX, for the tiled render tests
+# Started as: stub_chimerax.py [structure] script.cxc  (the regular render)
+#         or: stub_chimerax.py tile_XX_XX.py          (a tile: run with a fake chimerax package)
+# "save" draws a smooth synthetic scene through the camera model of ChimeraX's
+# perspective_view_projection_matrix: the frustum is left - xshift .. right - xshift,
+# bot - yshift .. top - yshift, i.e. pixel_shift moves the projected objects by (+x right, +y up) pixels.
+import sys
+import types
+from math import radians, tan
+
+import numpy as np
+from PIL import Image
+
+def scene(tx, ty):
+    # RGB of the direction (tx, ty) = tangents of the view angles, asymmetric in both axes
+    rgb = np.stack([128 + 450 * tx, 128 + 450 * ty, 128 + 1500 * tx * ty + 200 * tx], axis=-1)
+    return np.clip(np.rint(rgb), 0, 255).astype(np.uint8)
+
+class MonoCamera:
+    def __init__(self):
+        self.position = None
+        self.field_of_view = 30.0  # degrees, horizontal like ChimeraX
+
+    def pixel_shift(self, view_num=None):
+        return (0.0, 0.0)  # no supersampling jitter in the stub
+
+class View:
+    def __init__(self):
+        self.camera = MonoCamera()
+
+class Session:
+    def __init__(self):
+        self.main_view = View()
+
+def save(session, path, width, height):
+    camera = session.main_view.camera
+    sx, sy = camera.pixel_shift()
+    pixel = 2 * tan(radians(camera.field_of_view) / 2) / width  # square pixels
+    columns = np.arange(width) + 0.5
+    rows = np.arange(height) + 0.5
+    tx = (columns - width / 2 - sx) * pixel
+    ty = (height / 2 - rows - sy) * pixel
+    tx, ty = np.meshgrid(tx, ty)
+    Image.fromarray(scene(tx, ty)).save(path)
+
+def run(session, command):
+    words = command.split()
+    if not words:
+        return
+    if words[0] == "save":
+        options = dict(zip(words[2::2], words[3::2]))
+        save(session, words[1], int(options["width"]), int(options["height"]))
+    elif words[0] == "exit":
+        sys.exit(0)
+    # open / preset / color / ... do not change the synthetic scene
+
+def install_fake_chimerax():
+    modules = {name: types.ModuleType(name) for name in
+               ("chimerax", "chimerax.core", "chimerax.core.commands", "chimerax.graphics")}
+    modules["chimerax.core.commands"].run = run
+    modules["chimerax.graphics"].MonoCamera = MonoCamera
+    sys.modules.update(modules)
+
+def main(args):
+    script = args[-1]
+    session = Session()
+    if script.endswith(".py"):
+        install_fake_chimerax()
+        with open(script) as f:
+            exec(compile(f.read(), script, "exec"), {"session": session, "__name__": "__main__"})
+    else:
+        with open(script) as f:
+            for line in f:
+                run(session, line.strip())
+
+if __name__ == "__main__":
+    main(sys.argv[1:])